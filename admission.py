@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+import db
+
+# Admission control in front of the DB pool.
+# Every database checkout must first be admitted here. A request that cannot be
+# admitted before its class deadline is rejected with 503 + Retry-After instead of
+# queueing behind a saturated pool, which keeps p99 latency bounded during spikes.
+#
+# Priority classes:
+#   'write' - POST/PUT/DELETE handlers (create_order, send_message, ...). May use
+#             every connection and are admitted ahead of waiting reads.
+#   'read'  - GET handlers. Leave ADMISSION_WRITE_RESERVE connections free for
+#             writes and give way while a write is waiting for a connection (a
+#             write waiting only on its own endpoint limit does not hold reads back).
+# Per-endpoint limits (ADMISSION_ENDPOINT_LIMITS="get_all_gigs:2,get_orders_by_user:3")
+# stop a single heavy endpoint from occupying the whole pool.
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_WRITE_RESERVE = int(os.environ.get('ADMISSION_WRITE_RESERVE', 1))
+ADMISSION_READ_TIMEOUT = float(os.environ.get('ADMISSION_READ_TIMEOUT', 0.5))
+ADMISSION_WRITE_TIMEOUT = float(os.environ.get('ADMISSION_WRITE_TIMEOUT', 2))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 1))
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _parse_limits(value):
+    limits = {}
+    for item in value.split(','):
+        if ':' in item:
+            endpoint, limit = item.split(':', 1)
+            limits[endpoint.strip()] = int(limit)
+    return limits
+
+
+ADMISSION_ENDPOINT_LIMITS = _parse_limits(os.environ.get('ADMISSION_ENDPOINT_LIMITS', ''))
+
+
+class Overloaded(Exception):
+    """Raised when a request could not be admitted before its deadline."""
+
+
+def priority_for(method):
+    return 'read' if method in READ_METHODS else 'write'
+
+
+class AdmissionController:
+    def __init__(self, capacity, write_reserve, endpoint_limits):
+        self.capacity = capacity
+        # Reads always keep at least one slot for themselves.
+        self.write_reserve = min(write_reserve, capacity - 1)
+        self.endpoint_limits = endpoint_limits
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._per_endpoint = defaultdict(int)
+        self._waiting_writes = defaultdict(int)  # endpoint -> writes waiting to be admitted
+        self.stats = {'admitted_read': 0, 'admitted_write': 0, 'rejected_read': 0, 'rejected_write': 0}
+
+    def _at_endpoint_limit(self, endpoint):
+        limit = self.endpoint_limits.get(endpoint)
+        return limit is not None and self._per_endpoint[endpoint] >= limit
+
+    def _writes_waiting_for_capacity(self):
+        return sum(count for endpoint, count in self._waiting_writes.items()
+                   if count and not self._at_endpoint_limit(endpoint))
+
+    def _can_admit(self, endpoint, priority):
+        if self._at_endpoint_limit(endpoint):
+            return False
+        if priority == 'write':
+            return self._in_flight < self.capacity
+        return (self._in_flight < self.capacity - self.write_reserve
+                and self._writes_waiting_for_capacity() == 0)
+
+    def acquire(self, endpoint, priority):
+        """Blocks until the request is admitted; returns False once its deadline passes."""
+        timeout = ADMISSION_WRITE_TIMEOUT if priority == 'write' else ADMISSION_READ_TIMEOUT
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if priority == 'write':
+                self._waiting_writes[endpoint] += 1
+            try:
+                while not self._can_admit(endpoint, priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats[f'rejected_{priority}'] += 1
+                        return False
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+                self._per_endpoint[endpoint] += 1
+                self.stats[f'admitted_{priority}'] += 1
+                return True
+            finally:
+                if priority == 'write':
+                    self._waiting_writes[endpoint] -= 1
+                    # A read may have been held back only because this write was waiting.
+                    self._cond.notify_all()
+
+    def release(self, endpoint):
+        with self._cond:
+            self._in_flight -= 1
+            self._per_endpoint[endpoint] -= 1
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['in_flight'] = self._in_flight
+            stats['waiting_writes'] = sum(self._waiting_writes.values())
+        stats['capacity'] = self.capacity
+        return stats
+
+
+# One controller per pool role ('primary', 'replica'), each sized to that role's pools.
+_controllers = {}
+_controller_lock = threading.Lock()
+
+
+def get_controller(role='primary'):
+    """Returns this process's controller for role."""
+    controller = _controllers.get(role)
+    if controller is not None and controller.pid == os.getpid():
+        return controller
+    with _controller_lock:
+        controller = _controllers.get(role)
+        if controller is None or controller.pid != os.getpid():
+            controller = AdmissionController(db.pool_capacity(role), ADMISSION_WRITE_RESERVE,
+                                             ADMISSION_ENDPOINT_LIMITS)
+            _controllers[role] = controller
+        return controller
+
+
+def _reset_after_fork():
+    global _controllers, _controller_lock
+    _controllers = {}
+    _controller_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def admit(endpoint, method, role='primary'):
+    """Admits one DB checkout for endpoint on role's pools; returns the callable that releases it.
+
+    Raises Overloaded if the request could not be admitted in time.
+    """
+    if not ADMISSION_ENABLED:
+        return lambda: None
+    controller = get_controller(role)
+    if not controller.acquire(endpoint, priority_for(method)):
+        raise Overloaded()
+    return lambda: controller.release(endpoint)
+
+
+def admission_stats():
+    """Returns {role: stats} for this process's controllers."""
+    return {role: controller.snapshot() for role, controller in list(_controllers.items())
+            if controller.pid == os.getpid()}
@@ -0,0 +1,154 @@
+from datetime import date
+from decimal import Decimal
+
+# Freelancer order analytics from daily rollups (see migration 5).
+# freelancer_daily_stats has one row per freelancer and day with two kinds of counters:
+#   - by order date: orders_placed and the current status of the orders placed that
+#     day (pending/in_progress/completed/cancelled_count), i.e. the order funnel;
+#   - by delivery date: delivered_count, earnings (gig price) and completion_days_sum
+#     for orders completed that day.
+# create_order, create_orders_batch and update_order_status adjust the counters inside
+# their own transactions, so GET /api/users/<id>/analytics reads O(days) rows instead
+# of every order. rebuild() recomputes them set-based from orders JOIN gigs
+# (flask --app app rebuild-analytics); run it for historical data or after an outage
+# of the incremental path. Earnings use the gig's price at completion time.
+
+STATUS_COLUMNS = {
+    'pending': 'pending_count',
+    'in_progress': 'in_progress_count',
+    'completed': 'completed_count',
+    'cancelled': 'cancelled_count',
+}
+COUNTER_COLUMNS = ('orders_placed', *STATUS_COLUMNS.values(), 'delivered_count', 'earnings', 'completion_days_sum')
+
+
+def _add(cursor, freelancer_id, day, deltas):
+    """Adds deltas ({column: amount}) to one freelancer/day row, creating it if needed."""
+    columns = [column for column in deltas if column in COUNTER_COLUMNS]
+    if not columns:
+        return
+    sql = f"""
+        INSERT INTO freelancer_daily_stats (freelancer_id, day, {', '.join(columns)})
+        VALUES (%s, %s, {', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE {', '.join(f'{c} = {c} + VALUES({c})' for c in columns)}
+    """
+    cursor.execute(sql, (freelancer_id, day, *(deltas[c] for c in columns)))
+
+
+def record_orders_created(cursor, counts):
+    """counts: {(freelancer_id, order_date): number of new pending orders} (caller commits)."""
+    for (freelancer_id, order_date), count in counts.items():
+        _add(cursor, freelancer_id, order_date, {'orders_placed': count, 'pending_count': count})
+
+
+def lock_order(cursor, order_id):
+    """Locks an order for a status change; returns the state record_status_change needs, or None.
+
+    Only the order row is locked: a join in the FOR UPDATE would also lock the gig
+    row and serialise every status change and new order on that gig. The price is
+    read with a plain (non-locking) SELECT instead.
+    """
+    cursor.execute("""
+        SELECT freelancer_id, order_date, status, delivery_date, gig_id
+        FROM orders
+        WHERE order_id = %s
+        FOR UPDATE
+    """, (order_id,))
+    order = cursor.fetchone()
+    if order is None:
+        return None
+    freelancer_id, order_date, status, delivery_date, gig_id = order
+    cursor.execute("SELECT price FROM gigs WHERE gig_id = %s", (gig_id,))
+    gig = cursor.fetchone()
+    return freelancer_id, order_date, status, delivery_date, gig[0] if gig else None
+
+
+def _delivery(order_date, delivery_date, price, sign):
+    return {
+        'delivered_count': sign,
+        'earnings': sign * Decimal(price or 0),
+        'completion_days_sum': sign * (delivery_date - order_date).days,
+    }
+
+
+def record_status_change(cursor, order, new_status, delivery_date):
+    """Moves an order (as returned by lock_order) to new_status; delivery_date is set when completing."""
+    freelancer_id, order_date, old_status, old_delivery_date, price = order
+    if old_status != new_status:
+        deltas = {}
+        if old_status in STATUS_COLUMNS:
+            deltas[STATUS_COLUMNS[old_status]] = -1
+        deltas[STATUS_COLUMNS[new_status]] = deltas.get(STATUS_COLUMNS[new_status], 0) + 1
+        _add(cursor, freelancer_id, order_date, deltas)
+    if old_status == 'completed' and old_delivery_date is not None:
+        _add(cursor, freelancer_id, old_delivery_date, _delivery(order_date, old_delivery_date, price, -1))
+    if new_status == 'completed':
+        _add(cursor, freelancer_id, delivery_date, _delivery(order_date, delivery_date, price, 1))
+
+
+_REBUILD_PLACED = """
+    INSERT INTO freelancer_daily_stats
+        (freelancer_id, day, orders_placed, pending_count, in_progress_count, completed_count, cancelled_count)
+    SELECT freelancer_id, order_date, COUNT(*),
+           SUM(status = 'pending'), SUM(status = 'in_progress'), SUM(status = 'completed'), SUM(status = 'cancelled')
+    FROM orders
+    WHERE order_date >= %s
+    GROUP BY freelancer_id, order_date
+"""
+
+_REBUILD_DELIVERED = """
+    INSERT INTO freelancer_daily_stats (freelancer_id, day, delivered_count, earnings, completion_days_sum)
+    SELECT o.freelancer_id, o.delivery_date, COUNT(*), COALESCE(SUM(g.price), 0),
+           SUM(DATEDIFF(o.delivery_date, o.order_date))
+    FROM orders AS o
+    LEFT JOIN gigs AS g ON g.gig_id = o.gig_id
+    WHERE o.status = 'completed' AND o.delivery_date >= %s
+    GROUP BY o.freelancer_id, o.delivery_date
+    ON DUPLICATE KEY UPDATE
+        delivered_count = VALUES(delivered_count),
+        earnings = VALUES(earnings),
+        completion_days_sum = VALUES(completion_days_sum)
+"""
+
+
+def rebuild(cursor, since=None):
+    """Recomputes every row for days on or after since (all days if None) from orders (caller commits).
+
+    Rows for earlier days are left alone, so the funnel counters of orders placed
+    before since keep whatever the incremental path recorded. Each kind of counter
+    is rewritten by one GROUP BY statement rather than order by order.
+    """
+    since = since or date.min
+    cursor.execute("DELETE FROM freelancer_daily_stats WHERE day >= %s", (since,))
+    cursor.execute(_REBUILD_PLACED, (since,))
+    cursor.execute(_REBUILD_DELIVERED, (since,))
+
+
+def summarize(freelancer_id, start, end, rows):
+    """Turns freelancer_daily_stats rows (dicts, oldest first) into the API shape."""
+    totals = {column: 0 for column in COUNTER_COLUMNS}
+    daily = []
+    for values in rows:
+        for column in COUNTER_COLUMNS:
+            totals[column] += values[column] or 0
+        daily.append({
+            'day': values['day'],
+            'orders_placed': values['orders_placed'],
+            'by_status': {status: values[column] for status, column in STATUS_COLUMNS.items()},
+            'delivered': values['delivered_count'],
+            'earnings': values['earnings'],
+        })
+    delivered = totals['delivered_count']
+    return {
+        'freelancer_id': freelancer_id,
+        'from': start,
+        'to': end,
+        'totals': {
+            'orders_placed': totals['orders_placed'],
+            'by_status': {status: totals[column] for status, column in STATUS_COLUMNS.items()},
+            'delivered': delivered,
+            'earnings': totals['earnings'],
+            'average_completion_days': round(totals['completion_days_sum'] / delivered, 2) if delivered else None,
+        },
+        'daily': daily,
+    }
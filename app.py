@@ -1,78 +1,328 @@
+import os
+
+# `python app.py` serves through socketio.run(); patch the standard library first so
+# MySQL and Redis sockets cooperate with the event loop. Under gunicorn the
+# gevent/eventlet worker does this itself (see gunicorn.conf.py).
+if __name__ == '__main__' and os.environ.get('ASYNC_MODE', 'gevent') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif __name__ == '__main__' and os.environ.get('ASYNC_MODE') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+import click
 import mysql.connector
-from mysql.connector import pooling
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, has_request_context, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import os
-from datetime import datetime, date
+import base64
+import binascii
+import hashlib
+import time
+from datetime import datetime, date, timedelta
 from flask_socketio import SocketIO, emit
 
-app = Flask(__name__)
+import admission
+import analytics
+import cache
+import compression
+import db
+import idempotency
+import loaders
+import metrics
+import migrations
+import ratings
+import repository
+import search_index
+import similar_gigs
+import write_behind
+
+
+class RowJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes MySQL row values (datetime, date, Decimal) while serialising.
 
-# IMPORTANT: Database Configuration using Environment Variables
-# These variables MUST be set on your Render.com dashboard under the "Environment" tab.
-# Example values (replace with your actual MariaDB credentials):
-# DB_HOST = 'mariadb-198695-0.cloudclusters.net'
-# DB_PORT = '16326' # New: Port for your MariaDB (often non-standard on cloud DBs)
-# DB_USER = 'Abdullah2' # Your MariaDB/MySQL Username - UPDATED
-# DB_PASSWORD = 'abdullah' # Your MariaDB/MySQL Password - UPDATED
-# DB_NAME = 'freelancerrr' # Your MariaDB/MySQL Database Name - UPDATED
-
-# Get database credentials from environment variables, with fallbacks for local development
-DB_HOST = os.environ.get('DB_HOST', 'localhost')
-DB_PORT = int(os.environ.get('DB_PORT', 3306))
-DB_USER = os.environ.get('DB_USER', 'root')
-DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
-DB_NAME = os.environ.get('DB_NAME', 'freelancerrr')
+    Handlers can jsonify fetchall() results directly instead of rewriting every row first.
+    """
+    default = staticmethod(db.json_default)
+
+
+app = Flask(__name__)
+app.json = RowJSONProvider(app)
 
 # Setup CORS - Crucial for connecting your GitHub Pages frontend
 # This includes both the base domain and the specific repository path for robustness.
 # Allow WebSocket origins explicitly for Flask-SocketIO
 CORS(app, resources={r"/api/*": {"origins": ["https://abdullah1228.github.io/freelancer-frontend/", "https://abdullah1228.github.io"]}},
-     supports_credentials=True)
+     supports_credentials=True, expose_headers=['X-Next-Cursor', 'X-Next-Offset', 'X-Has-More', 'ETag', 'Retry-After',
+                                                     idempotency.REPLAYED_HEADER, 'X-DB-Primary-Until'])
 
 # Initialize Flask-SocketIO
-# async_mode='gevent' or 'eventlet' is recommended for production.
-# For simplicity in Render deployment, we'll start with 'threading' if no explicit async library.
-# If you have Gunicorn config, ensure it's set up for eventlet/gevent workers.
+# async_mode follows ASYNC_MODE (default 'gevent'), which gunicorn.conf.py also uses
+# to pick the matching worker class. Blocking MySQL calls are made cooperative by
+# db.DB_ASYNC_DRIVER. The Redis message_queue lets several workers or nodes share rooms.
 socketio = SocketIO(app, cors_allowed_origins=["https://abdullah1228.github.io", "https://abdullah1228.github.io/freelancer-frontend/"],
-                    message_queue=os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+                    message_queue=cache.REDIS_URL, async_mode=db.ASYNC_MODE)
+
+# Instrumentation (see metrics.py)
+# Requests are timed from the first before_request hook to the end of the body, so
+# for streamed responses the latency and size are recorded once the stream is done.
+if metrics.METRICS_ENABLED:
+    db.instrumentation = metrics
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def count_streamed_body(chunks, finished):
+    size = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            size += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        finished(size)
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None or not metrics.METRICS_ENABLED:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    labels = {'endpoint': endpoint, 'method': request.method, 'status': response.status_code}
+
+    def finished(size):
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, **labels)
+        metrics.observe('http_response_size_bytes', size, endpoint=endpoint)
+        metrics.push()
+
+    if response.is_streamed:
+        response.response = count_streamed_body(response.response, finished)
+    else:
+        finished(response.calculate_content_length() or 0)
+    return response
+
 
 # Database Connection Pool
-try:
-    db_pool = pooling.MySQLConnectionPool(
-        pool_name="freelancerrr_pool",
-        pool_size=5,
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME
-    )
-    print("MySQL connection pool created successfully.")
-except mysql.connector.Error as err:
-    print(f"Error creating MySQL connection pool: {err}")
+# The pools live in db.py and are created lazily in each worker after fork.
+# Each checkout is admitted by admission.py first; when the pool is saturated the
+# request fails fast with 503 (see handle_overloaded) instead of queueing.
+# With DB_REPLICAS set, GET requests read from a replica unless the client wrote
+# within the last DB_STICKY_SECONDS, so users always see their own writes despite
+# replication lag. After a successful write pin_reads_to_primary returns the
+# deadline in the PRIMARY_HEADER response header, and the client sends it back on
+# its following requests. The same value is also set as the PRIMARY_COOKIE for
+# same-site clients; for the github.io frontend that cookie is third-party, which
+# Safari and Firefox block by default, so the frontend must echo the header.
+# A client can only pin itself, for at most DB_STICKY_SECONDS at a time.
+PRIMARY_HEADER = 'X-DB-Primary-Until'
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+def reads_pinned_to_primary():
+    if not has_request_context():
+        return False
+    value = request.headers.get(PRIMARY_HEADER) or request.cookies.get(PRIMARY_COOKIE)
+    try:
+        until = min(float(value or 0), time.time() + db.DB_STICKY_SECONDS)
+    except ValueError:
+        return False
+    return until > time.time()
 
-def get_db_connection():
-    """Gets a connection from the pool."""
-    global db_pool
+
+def checkout_connection(pool, endpoint, method):
+    release = admission.admit(endpoint, method, pool.role)
     try:
-        return db_pool.get_connection()
+        with metrics.timer('db_pool_wait_seconds', pool=pool.name):
+            conn = pool.get_connection()
+    except db.PoolTimeout as err:
+        release()
+        print(f"Error getting connection from pool '{pool.name}': {err}")
+        return None
     except mysql.connector.Error as err:
-        print(f"Error getting connection from pool: {err}. Attempting to recreate pool...")
+        print(f"Error getting connection from pool '{pool.name}': {err}. Attempting to rebuild pool...")
         try:
-            db_pool = pooling.MySQLConnectionPool(
-                pool_name="freelancerrr_pool",
-                pool_size=5,
-                host=DB_HOST,
-                port=DB_PORT,
-                user=DB_USER,
-                password=DB_PASSWORD,
-                database=DB_NAME
-            )
-            return db_pool.get_connection()
+            conn = db.rebuild_pool(pool).get_connection()
         except mysql.connector.Error as pool_err:
-            print(f"Failed to recreate MySQL connection pool: {pool_err}")
+            release()
+            print(f"Failed to get connection from rebuilt pool '{pool.name}': {pool_err}")
             return None
+    conn.on_release = release
+    return conn
+
+
+def get_db_connection():
+    """Gets a connection from this worker's pools, or None if none could be obtained."""
+    if has_request_context():
+        endpoint, method = request.endpoint, request.method
+    else:
+        endpoint, method = None, 'POST'
+
+    if db.DB_REPLICAS and method in admission.READ_METHODS and not reads_pinned_to_primary():
+        conn = checkout_connection(db.get_replica_pool(), endpoint, method)
+        if conn is not None:
+            return conn
+        # The replica is unavailable; serve the read from the primary instead.
+    return checkout_connection(db.get_pool(), endpoint, method)
+
+
+@app.after_request
+def pin_reads_to_primary(response):
+    if db.DB_REPLICAS and request.method not in admission.READ_METHODS and response.status_code < 400:
+        until = str(time.time() + db.DB_STICKY_SECONDS)
+        response.headers[PRIMARY_HEADER] = until
+        secure = request.is_secure or request.headers.get('X-Forwarded-Proto') == 'https'
+        # The frontend is cross-site, which needs SameSite=None (and therefore Secure) over HTTPS.
+        response.set_cookie(PRIMARY_COOKIE, until,
+                            max_age=int(db.DB_STICKY_SECONDS) + 1, httponly=True,
+                            secure=secure, samesite='None' if secure else 'Lax')
+    return response
+
+
+@app.errorhandler(admission.Overloaded)
+def handle_overloaded(err):
+    response = jsonify({'message': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = str(admission.ADMISSION_RETRY_AFTER)
+    return response, 503
+
+
+DatabaseUnavailable = repository.DatabaseUnavailable
+
+
+# --- Streaming responses ---
+# With ?stream=1 the large list endpoints read rows from an unbuffered cursor in
+# batches of STREAM_FETCH_SIZE and write the JSON array to the client as they go,
+# so memory per request stays bounded however many rows match.
+STREAM_FETCH_SIZE = int(os.environ.get('STREAM_FETCH_SIZE', 500))
+
+
+def wants_stream():
+    return request.args.get('stream') in ('1', 'true')
+
+
+def stream_rows(conn, cursor):
+    """Returns a response streaming the executed cursor's rows as a JSON array.
+
+    cursor must be unbuffered (the connector's default) so rows are pulled from the
+    server as the client reads. The stream takes ownership of conn and cursor and
+    closes both when it ends, or when the response is closed without the body being
+    read at all (HEAD, or a client that disconnects before the first chunk).
+    """
+    released = False
+
+    def release():
+        nonlocal released
+        if released:
+            return
+        released = True
+        try:
+            cursor.close()
+        except mysql.connector.InternalError:
+            # "Unread result found": the client went away mid-stream. The pool
+            # discards the connection instead of reusing it (ConnectionPool.release).
+            pass
+        finally:
+            conn.close()
+
+    def generate():
+        try:
+            yield '['
+            separator = ''
+            while True:
+                rows = cursor.fetchmany(STREAM_FETCH_SIZE)
+                if not rows:
+                    break
+                yield separator + ','.join(app.json.dumps(row, separators=(',', ':')) for row in rows)
+                separator = ','
+            yield ']'
+        except mysql.connector.Error as err:
+            # Headers are already sent; the client sees a truncated array.
+            print(f"Error while streaming rows: {err}")
+        finally:
+            release()
+
+    body = stream_with_context(generate())
+    response = app.response_class(body, mimetype='application/json')
+    # Response.close() runs these even if nothing iterated the body; closing it also
+    # pops the request context stream_with_context pushed.
+    response.call_on_close(body.close)
+    response.call_on_close(release)
+    return response
+
+
+# --- Conditional GET support (ETag / If-None-Match) ---
+# ETags are derived from a cheap validator (a cache namespace version or an
+# aggregate such as COUNT/MAX over the rows) rather than by hashing the body,
+# so a matching poll is answered with 304 before the real query runs.
+
+def etag_version(namespace):
+    """Returns the namespace version to build an ETag from, or None when no ETag should be sent.
+
+    Right after a bump a replica may not have the write yet; a response read from it
+    must not carry the new version, or clients would keep it (304) until the next bump.
+    """
+    version, recently_bumped = cache.get_version_state(namespace)
+    if recently_bumped and not reads_pinned_to_primary():
+        return None
+    return version
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:24]
+
+
+def not_modified(etag):
+    """Returns a 304 response if the request's If-None-Match matches etag, otherwise None."""
+    if etag and request.if_none_match.contains_weak(etag):
+        return with_etag(app.response_class(status=304), etag)
+    return None
+
+
+def with_etag(response, etag):
+    if etag:
+        response.set_etag(etag, weak=True)
+        # Lets browsers keep the body but makes them revalidate on every poll.
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# --- Response compression (see compression.py) ---
+# Registered after record_request_metrics so that it runs before it (Flask calls
+# after_request hooks in reverse order) and the size metrics see the bytes
+# actually sent.
+@app.after_request
+def compress_response(response):
+    if (not compression.COMPRESSION_ENABLED or request.method == 'HEAD'
+            or not compression.is_compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = compression.negotiate(request.accept_encodings)
+    if (encoding is None or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    if response.is_streamed:
+        response.response = compression.compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < compression.COMPRESSION_MIN_BYTES:
+            return response
+        etag = response.get_etag()[0]
+        if etag:
+            body, hit = compression.cached_compress((request.endpoint, etag, encoding), data, encoding)
+            metrics.inc('http_compression_cache_total', endpoint=request.endpoint, result='hit' if hit else 'miss')
+        else:
+            body = compression.compress(data, encoding)
+        response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 # --- NEW: Simple Test Route for Root URL ---
 @app.route('/')
@@ -94,21 +344,12 @@ def register_user():
     if not all([name, email, password, user_type]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
-
-    cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
-        if cursor.fetchone():
-            return jsonify({'message': 'User with this email already exists'}), 409
-
-        sql = "INSERT INTO users (name, email, password, user_type, created_at) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(sql, (name, email, password, user_type, join_date))
-        conn.commit()
+        with repository.session(get_db_connection, write=True) as session:
+            if repository.email_taken(session, email):
+                return jsonify({'message': 'User with this email already exists'}), 409
+            user_id = repository.create_user(session, name, email, password, user_type, join_date)
 
-        user_id = cursor.lastrowid
         new_user = {
             "user_id": user_id,
             "name": name,
@@ -117,13 +358,11 @@ def register_user():
             "join_date": join_date
         }
         return jsonify({'message': 'User registered successfully', 'user': new_user}), 201
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
-        conn.rollback()
         print(f"Error during user registration: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # User Login
@@ -136,71 +375,110 @@ def login_user():
     if not all([email, password]):
         return jsonify({'message': 'Missing email or password'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
-
-    cursor = conn.cursor(dictionary=True)
     try:
-        sql = "SELECT user_id, name, email, user_type, created_at FROM users WHERE email = %s AND password = %s"
-        cursor.execute(sql, (email, password))
-        user = cursor.fetchone()
+        with repository.session(get_db_connection) as session:
+            user = repository.find_user_by_login(session, email, password)
 
         if user:
-            if isinstance(user['created_at'], (datetime, date)):
-                user['created_at'] = user['created_at'].isoformat()
-
-            user_data_for_frontend = {
-                "user_id": user['user_id'],
-                "name": user['name'],
-                "email": user['email'],
-                "user_type": user['user_type'],
-                "join_date": user['created_at']
-            }
-            return jsonify({'message': 'Login successful', 'user': user_data_for_frontend}), 200
+            return jsonify({'message': 'Login successful', 'user': user}), 200
         else:
             return jsonify({'message': 'Wrong username or password'}), 401
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
         print(f"Error during user login: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+
+# --- Batch lookups by id ---
+# GET /api/users?ids=1,2,3 and GET /api/gigs?ids=4,5 resolve up to MULTI_GET_MAX_IDS
+# ids with a single IN (...) query through the per-request loaders in loaders.py.
+MULTI_GET_MAX_IDS = int(os.environ.get('MULTI_GET_MAX_IDS', 100))
+
+
+def parse_ids_param(value):
+    """Parses a comma separated id list; returns the ints, or None if malformed or too long."""
+    try:
+        ids = [int(i) for i in value.split(',') if i.strip()]
+    except ValueError:
+        return None
+    if not ids or len(ids) > MULTI_GET_MAX_IDS:
+        return None
+    return ids
+
+
+def fetch_users(ids):
+    with repository.session(get_db_connection) as session:
+        cursor = session.cursor(dictionary=True)
+        sql = f"""
+            SELECT user_id, name, email, user_type, created_at AS join_date
+            FROM users
+            WHERE user_id IN ({', '.join(['%s'] * len(ids))})
+        """
+        cursor.execute(sql, tuple(ids))
+        return {row['user_id']: row for row in cursor.fetchall()}
+
+
+def fetch_gigs(ids):
+    with repository.session(get_db_connection) as session:
+        cursor = session.cursor(dictionary=True)
+        sql = f"""
+            SELECT {', '.join(GIG_FIELDS.values())} {GIG_LIST_FROM}
+            WHERE g.gig_id IN ({', '.join(['%s'] * len(ids))})
+        """
+        cursor.execute(sql, tuple(ids))
+        return {row['id']: row for row in cursor.fetchall()}
+
+
+# Get many Users by ID
+# Returns the users that exist, in the order their ids were given (duplicates once).
+@app.route('/api/users', methods=['GET'])
+def get_users_by_ids():
+    ids = parse_ids_param(request.args.get('ids', ''))
+    if ids is None:
+        return jsonify({'message': f'ids must be 1 to {MULTI_GET_MAX_IDS} comma separated integers'}), 400
+
+    try:
+        users = loaders.get_loader('users', fetch_users).load_many(list(dict.fromkeys(ids)))
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error fetching users: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
+    return jsonify([user for user in users if user]), 200
+
+
+def get_gigs_by_ids(ids):
+    fields = parse_gig_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'message': f"Invalid fields parameter. Allowed: {', '.join(GIG_FIELDS)}"}), 400
+
+    try:
+        gigs = loaders.get_loader('gigs', fetch_gigs).load_many(list(dict.fromkeys(ids)))
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error fetching gigs: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
+    return jsonify([{f: gig[f] for f in fields} for gig in gigs if gig]), 200
 
 
 # Get User by ID
 @app.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user_by_id(user_id):
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
-
-    cursor = conn.cursor(dictionary=True)
     try:
-        sql = "SELECT user_id, name, email, user_type, created_at FROM users WHERE user_id = %s"
-        cursor.execute(sql, (user_id,))
-        user = cursor.fetchone()
+        with repository.session(get_db_connection) as session:
+            user = repository.get_user(session, user_id)
 
         if user:
-            if isinstance(user['created_at'], (datetime, date)):
-                user['created_at'] = user['created_at'].isoformat()
-
-            user_data_for_frontend = {
-                "user_id": user['user_id'],
-                "name": user['name'],
-                "email": user['email'],
-                "user_type": user['user_type'],
-                "join_date": user['created_at']
-            }
-            return jsonify(user_data_for_frontend), 200
+            return jsonify(user), 200
         else:
             return jsonify({'message': 'User not found'}), 404
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
         print(f"Error fetching user: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # Create Gig
@@ -216,133 +494,506 @@ def create_gig():
     if not all([user_id, title, description, category_name, price]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        with repository.session(get_db_connection, write=True) as session:
+            category_id = repository.get_category_id(session, category_name)
+            if category_id is None:
+                return jsonify({'message': 'Invalid category provided. Category name not found.'}), 400
+            gig_id = repository.create_gig(session, user_id, title, description, category_id, price)
+    except DatabaseUnavailable:
         return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error creating gig: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
 
-    cursor = conn.cursor(dictionary=True)
+    # Every cached gig list page may now be missing this gig.
+    cache.bump_version('gigs')
+    if not fulltext_search_available:
+        # InnoDB maintains the FULLTEXT index itself; the fallback index needs the new gig.
+        search_index.get_index().add(gig_id, title, description, category_name, price)
+    similar_gigs.add_gig(gig_id, title, description, category_name)
+    return jsonify({'message': 'Gig created successfully', 'gig_id': gig_id}), 201
+
+
+# Gig list pagination: keyset cursor over (created_at, gig_id) so every page
+# costs the same index range scan no matter how deep the client pages.
+GIGS_PAGE_SIZE = int(os.environ.get('GIGS_PAGE_SIZE', 50))
+GIGS_MAX_PAGE_SIZE = int(os.environ.get('GIGS_MAX_PAGE_SIZE', 200))
+
+# Columns a client may request via ?fields=; 'id' is always returned.
+GIG_FIELDS = {
+    'id': 'g.gig_id AS id',
+    'user_id': 'g.user_id',
+    'title': 'g.title',
+    'description': 'g.description',
+    'category': 'c.name AS category',
+    'price': 'g.price',
+    'created_at': 'g.created_at',
+    'rating_average': 'ROUND(s.rating_sum / NULLIF(s.rating_count, 0), 2) AS rating_average',
+    'rating_count': 'COALESCE(s.rating_count, 0) AS rating_count',
+}
+
+# Gig list queries join the rating summary row (one primary-key lookup per gig).
+GIG_LIST_FROM = """
+            FROM gigs AS g
+            JOIN categories AS c ON g.category_id = c.category_id
+            LEFT JOIN gig_rating_summary AS s ON s.gig_id = g.gig_id
+"""
+
+
+def encode_gig_cursor(created_at, gig_id):
+    """Encodes the position of the last gig on a page as an opaque cursor."""
+    if isinstance(created_at, (datetime, date)):
+        created_at = created_at.isoformat()
+    raw = f"{created_at}|{gig_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_gig_cursor(cursor_value):
+    """Returns (created_at, gig_id) from a cursor, or None if it is malformed."""
     try:
-        cursor.execute("SELECT category_id FROM categories WHERE name = %s", (category_name,))
-        category_result = cursor.fetchone()
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        created_at, gig_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(gig_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+def parse_gig_fields(fields_param):
+    """Returns the list of requested gig fields, or None if any are unknown."""
+    if not fields_param:
+        return list(GIG_FIELDS)
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    if any(f not in GIG_FIELDS for f in fields):
+        return None
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def gig_filters(category=None, min_price=None, max_price=None, user_id=None):
+    """Returns (sql, params) with one ' AND ...' condition per filter that is set."""
+    sql, params = '', []
+    if category:
+        sql += " AND c.name = %s"
+        params.append(category)
+    if min_price is not None:
+        sql += " AND g.price >= %s"
+        params.append(min_price)
+    if max_price is not None:
+        sql += " AND g.price <= %s"
+        params.append(max_price)
+    if user_id is not None:
+        sql += " AND g.user_id = %s"
+        params.append(user_id)
+    return sql, params
+
+
+def parse_gig_filter_args():
+    return {
+        'category': request.args.get('category') or None,
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'user_id': request.args.get('user_id', type=int),
+    }
+
+
+def load_gig_page(limit, after, fields, filters):
+    """Runs the gig list query for one page and returns {'gigs': [...], 'next_cursor': ...}."""
+    with repository.session(get_db_connection) as session:
+        cursor = session.cursor(dictionary=True)
+        # created_at is needed to build the next cursor even when the client did not ask for it.
+        columns = [GIG_FIELDS[f] for f in fields]
+        if 'created_at' not in fields:
+            columns.append(GIG_FIELDS['created_at'])
+        filter_sql, params = gig_filters(**filters)
+        sql = f"SELECT {', '.join(columns)} {GIG_LIST_FROM} WHERE 1 = 1 {filter_sql}"
+        if after:
+            sql += " AND (g.created_at < %s OR (g.created_at = %s AND g.gig_id < %s))"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY g.created_at DESC, g.gig_id DESC LIMIT %s"
+        params.append(limit + 1)
 
-        if not category_result:
-            return jsonify({'message': 'Invalid category provided. Category name not found.'}), 400
-        category_id = category_result['category_id']
+        cursor.execute(sql, tuple(params))
+        gigs = cursor.fetchall()
 
-        sql = "INSERT INTO gigs (user_id, title, description, category_id, price) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(sql, (user_id, title, description, category_id, price))
-        conn.commit()
-        gig_id = cursor.lastrowid
+        next_cursor = None
+        if len(gigs) > limit:
+            gigs = gigs[:limit]
+            next_cursor = encode_gig_cursor(gigs[-1]['created_at'], gigs[-1]['id'])
 
-        return jsonify({'message': 'Gig created successfully', 'gig_id': gig_id}), 201
-    except mysql.connector.Error as err:
-        conn.rollback()
-        print(f"Error creating gig: {err}")
-        return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
+        if 'created_at' not in fields:
+            for gig in gigs:
+                del gig['created_at']
+        return {'gigs': gigs, 'next_cursor': next_cursor}
+
+
+def stream_all_gigs(fields, filters):
+    """Streams every matching gig (newest first) instead of a single page."""
+    conn = get_db_connection()
+    if conn is None:
+        raise DatabaseUnavailable()
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        filter_sql, params = gig_filters(**filters)
+        sql = f"""
+            SELECT {', '.join(GIG_FIELDS[f] for f in fields)} {GIG_LIST_FROM}
+            WHERE 1 = 1 {filter_sql}
+            ORDER BY g.created_at DESC, g.gig_id DESC
+        """
+        cursor.execute(sql, tuple(params))
+    except mysql.connector.Error:
         cursor.close()
         conn.close()
+        raise
+    return stream_rows(conn, cursor)
 
 
 # Get all Gigs
+# Query parameters:
+#   limit  - page size (default GIGS_PAGE_SIZE, capped at GIGS_MAX_PAGE_SIZE)
+#   cursor - value of the X-Next-Cursor header from the previous page
+#   fields - comma separated subset of GIG_FIELDS, e.g. fields=id,title,price
+#   stream - 1 to stream the whole catalog in one response (limit/cursor are ignored)
+#   category, min_price, max_price, user_id - filters, served by the composite
+#            (category_id|user_id, created_at, gig_id) indexes from migration 3
+#   ids    - comma separated gig ids: returns just those gigs (see get_gigs_by_ids)
 @app.route('/api/gigs', methods=['GET'])
 def get_all_gigs():
-    conn = get_db_connection()
-    if conn is None:
+    if 'ids' in request.args:
+        ids = parse_ids_param(request.args['ids'])
+        if ids is None:
+            return jsonify({'message': f'ids must be 1 to {MULTI_GET_MAX_IDS} comma separated integers'}), 400
+        return get_gigs_by_ids(ids)
+
+    limit = request.args.get('limit', GIGS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, GIGS_MAX_PAGE_SIZE))
+
+    fields = parse_gig_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'message': f"Invalid fields parameter. Allowed: {', '.join(GIG_FIELDS)}"}), 400
+
+    after = None
+    cursor_param = request.args.get('cursor', '')
+    if cursor_param:
+        after = decode_gig_cursor(cursor_param)
+        if after is None:
+            return jsonify({'message': 'Invalid cursor parameter'}), 400
+
+    filters = parse_gig_filter_args()
+    filter_key = '|'.join(str(filters[k]) for k in sorted(filters))
+
+    # The list only changes when create_gig bumps the 'gigs' version. Without Redis
+    # there is no cheap validator, so the response is sent without an ETag.
+    stream = wants_stream()
+    version = etag_version('gigs')
+    etag = make_etag('gigs', version, limit, ','.join(fields), cursor_param, stream, filter_key) if version is not None else None
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    if stream:
+        try:
+            return with_etag(stream_all_gigs(fields, filters), etag), 200
+        except DatabaseUnavailable:
+            return jsonify({'message': 'Database connection failed'}), 500
+        except mysql.connector.Error as err:
+            print(f"Error fetching gigs: {err}")
+            return jsonify({'message': f'Database error: {err}'}), 500
+
+    try:
+        page = cache.read_through(('list', limit, ','.join(fields), cursor_param, filter_key), cache.GIG_LIST_TTL,
+                                  lambda: load_gig_page(limit, after, fields, filters), namespace='gigs')
+    except DatabaseUnavailable:
         return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error fetching gigs: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
+
+    response = with_etag(jsonify(page['gigs']), etag)
+    if page['next_cursor']:
+        response.headers['X-Next-Cursor'] = page['next_cursor']
+    return response, 200
+
+
+# Upper bounds of the price buckets reported by /api/gigs/facets; the last bucket is open-ended.
+GIG_PRICE_BUCKETS = [float(b) for b in os.environ.get('GIG_PRICE_BUCKETS', '25,50,100,250,500').split(',')]
+
+
+def load_gig_facets():
+    with repository.session(get_db_connection) as session:
+        cursor = session.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT c.category_id AS id, c.name, COUNT(g.gig_id) AS count
+            FROM categories AS c
+            LEFT JOIN gigs AS g ON g.category_id = c.category_id
+            GROUP BY c.category_id, c.name
+            ORDER BY c.name
+        """)
+        categories = cursor.fetchall()
+
+        cases = ' '.join(f"WHEN price < %s THEN {i}" for i in range(len(GIG_PRICE_BUCKETS)))
+        cursor.execute(f"""
+            SELECT CASE {cases} ELSE {len(GIG_PRICE_BUCKETS)} END AS bucket, COUNT(*) AS count
+            FROM gigs
+            GROUP BY bucket
+        """, tuple(GIG_PRICE_BUCKETS))
+        counts = {row['bucket']: row['count'] for row in cursor.fetchall()}
+
+        bounds = [0.0] + GIG_PRICE_BUCKETS + [None]
+        price_buckets = [{'min': bounds[i], 'max': bounds[i + 1], 'count': counts.get(i, 0)}
+                         for i in range(len(bounds) - 1)]
+        return {'categories': categories, 'price_buckets': price_buckets}
+
+
+# Gig counts per category and per price bucket (min inclusive, max exclusive).
+# Cached until the next create_gig bumps the 'gigs' version.
+@app.route('/api/gigs/facets', methods=['GET'])
+def get_gig_facets():
+    version = etag_version('gigs')
+    etag = make_etag('gig-facets', version) if version is not None else None
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
 
-    cursor = conn.cursor(dictionary=True)
     try:
-        sql = """
-            SELECT g.gig_id AS id,
-                   g.user_id,
-                   g.title,
-                   g.description,
-                   c.name AS category,
-                   g.price,
-                   g.created_at
-            FROM gigs AS g
-            JOIN categories AS c ON g.category_id = c.category_id
-            ORDER BY g.created_at DESC
-        """
-        cursor.execute(sql)
-        gigs = cursor.fetchall()
+        facets = cache.read_through(('facets',), cache.GIG_LIST_TTL, load_gig_facets, namespace='gigs')
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error fetching gig facets: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
+    return with_etag(jsonify(facets), etag), 200
+
+
+def load_gig(gig_id):
+    """Returns a single gig with its rating summary as a dict, or None if it does not exist."""
+    with repository.session(get_db_connection) as session:
+        return repository.get_gig(session, gig_id)
+
+
+# --- Gig Search ---
+# GET /api/gigs/search ranks gigs with MATCH ... AGAINST over the FULLTEXT index on
+# gigs(title, description) (migration 2). Where the database cannot run that
+# (no FULLTEXT support or index), the in-process index in search_index.py is used.
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')  # auto | fulltext | memory
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', 50))
+# ER_FT_MATCHING_KEY_NOT_FOUND, ER_TABLE_CANT_HANDLE_FT
+FULLTEXT_UNSUPPORTED_ERRORS = (1191, 1214)
+fulltext_search_available = SEARCH_BACKEND != 'memory'
+
+
+def search_gigs_fulltext(session, q, fields, category, min_price, max_price, limit, offset):
+    """Returns up to limit + 1 ranked gigs, each with a 'score'."""
+    filters, filter_params = gig_filters(category, min_price, max_price)
+    match = "MATCH(g.title, g.description) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+    sql = f"""
+        SELECT {', '.join(GIG_FIELDS[f] for f in fields)}, {match} AS score
+        {GIG_LIST_FROM}
+        WHERE {match} {filters}
+        ORDER BY score DESC, g.gig_id DESC
+        LIMIT %s OFFSET %s
+    """
+    cursor = session.cursor(dictionary=True)
+    cursor.execute(sql, (q, q, *filter_params, limit + 1, offset))
+    return cursor.fetchall()
+
+
+def search_gigs_memory(session, q, fields, category, min_price, max_price, limit, offset):
+    """Same contract as search_gigs_fulltext, ranked by the in-process index."""
+    search_index.refresh(session.cursor())
+    ranked = search_index.get_index().search(q, category, min_price, max_price)[offset:offset + limit + 1]
+    return load_ranked_gigs(session, ranked, fields)
+
+
+def load_ranked_gigs(session, ranked, fields):
+    """Loads the gigs of [(gig_id, score)] in that order, each with its 'score'."""
+    if not ranked:
+        return []
+
+    cursor = session.cursor(dictionary=True)
+    sql = f"""
+        SELECT {', '.join(GIG_FIELDS[f] for f in fields)}
+        {GIG_LIST_FROM}
+        WHERE g.gig_id IN ({', '.join(['%s'] * len(ranked))})
+    """
+    cursor.execute(sql, tuple(gig_id for gig_id, _ in ranked))
+    rows = {row['id']: row for row in cursor.fetchall()}
+
+    gigs = []
+    for gig_id, score in ranked:
+        if gig_id in rows:
+            rows[gig_id]['score'] = score
+            gigs.append(rows[gig_id])
+    return gigs
+
+
+# Search Gigs
+# Query parameters:
+#   q                    - search text (required), matched against title and description
+#   category             - exact category name
+#   min_price, max_price - price range
+#   limit, offset        - page (limit capped at SEARCH_MAX_PAGE_SIZE); X-Next-Offset is
+#                          set when there are more results
+#   fields               - as for GET /api/gigs
+@app.route('/api/gigs/search', methods=['GET'])
+def search_gigs():
+    global fulltext_search_available
+
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'message': 'Missing q parameter'}), 400
+    category = request.args.get('category')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), SEARCH_MAX_PAGE_SIZE))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    fields = parse_gig_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'message': f"Invalid fields parameter. Allowed: {', '.join(GIG_FIELDS)}"}), 400
+
+    args = (q, fields, category, min_price, max_price, limit, offset)
+    try:
+        with repository.session(get_db_connection) as session:
+            gigs = None
+            if fulltext_search_available:
+                try:
+                    gigs = search_gigs_fulltext(session, *args)
+                except mysql.connector.Error as err:
+                    if err.errno not in FULLTEXT_UNSUPPORTED_ERRORS or SEARCH_BACKEND == 'fulltext':
+                        raise
+                    print(f"FULLTEXT search unavailable ({err}); using the in-process search index.")
+                    fulltext_search_available = False
+            if gigs is None:
+                gigs = search_gigs_memory(session, *args)
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error searching gigs: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
+
+    has_more = len(gigs) > limit
+    gigs = gigs[:limit]
+    for gig in gigs:
+        gig['score'] = round(float(gig['score']), 4)
+
+    response = jsonify(gigs)
+    if has_more:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response, 200
+
+
+# Get Gigs similar to a Gig
+# Query parameters:
+#   limit  - number of gigs (default SIMILAR_GIGS_PAGE_SIZE, capped at SIMILAR_GIGS_MAX_PAGE_SIZE)
+#   fields - as for GET /api/gigs
+# Gigs are ranked by the cosine similarity of their title, description and category
+# (similar_gigs.py), best first, each with a 'score' between 0 and 1.
+# Until the index has been built on this host the answer is 503 with Retry-After;
+# the first such request starts the build in the background.
+SIMILAR_GIGS_RETRY_AFTER = int(os.environ.get('SIMILAR_GIGS_RETRY_AFTER', 5))
+SIMILAR_GIGS_PAGE_SIZE = int(os.environ.get('SIMILAR_GIGS_PAGE_SIZE', 10))
+SIMILAR_GIGS_MAX_PAGE_SIZE = int(os.environ.get('SIMILAR_GIGS_MAX_PAGE_SIZE', 50))
+
+
+@app.route('/api/gigs/<int:gig_id>/similar', methods=['GET'])
+def get_similar_gigs(gig_id):
+    if not similar_gigs.available():
+        return jsonify({'message': 'Similar gigs are not available (NumPy is not installed)'}), 503
+    limit = max(1, min(request.args.get('limit', SIMILAR_GIGS_PAGE_SIZE, type=int), SIMILAR_GIGS_MAX_PAGE_SIZE))
+    fields = parse_gig_fields(request.args.get('fields'))
+    if fields is None:
+        return jsonify({'message': f"Invalid fields parameter. Allowed: {', '.join(GIG_FIELDS)}"}), 400
+
+    # Gigs are only ever added (which bumps the 'gigs' version), so it validates the ranking too.
+    version = etag_version('gigs')
+    etag = make_etag('similar', gig_id, version, limit, ','.join(fields)) if version is not None else None
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
 
-        for gig in gigs:
-            if isinstance(gig['created_at'], (datetime, date)):
-                gig['created_at'] = gig['created_at'].isoformat()
-            gig['price'] = float(gig['price'])
-        return jsonify(gigs), 200
+    try:
+        if not similar_gigs.ensure_index(get_db_connection, socketio.start_background_task):
+            response = jsonify({'message': 'Similar gigs index is being built, retry shortly'})
+            response.headers['Retry-After'] = str(SIMILAR_GIGS_RETRY_AFTER)
+            return response, 503
+        with repository.session(get_db_connection) as session:
+            ranked = similar_gigs.similar(session.cursor(), gig_id, limit)
+            if ranked is None:
+                return jsonify({'message': 'Gig not found'}), 404
+            gigs = load_ranked_gigs(session, ranked, fields)
+    except OSError as err:
+        print(f"Error reading the similar gigs index: {err}")
+        return jsonify({'message': 'Similar gigs index is unavailable'}), 503
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
-        print(f"Error fetching gigs: {err}")
+        print(f"Error fetching similar gigs: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+    for gig in gigs:
+        gig['score'] = round(gig['score'], 4)
+    return with_etag(jsonify(gigs), etag), 200
 
 
 # Get single Gig by ID
 @app.route('/api/gigs/<int:gig_id>', methods=['GET'])
 def get_gig_by_id(gig_id):
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
+    version = etag_version(f'gig:{gig_id}')
+    etag = make_etag('gig', gig_id, version) if version is not None else None
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
 
-    cursor = conn.cursor(dictionary=True)
     try:
-        sql = """
-            SELECT g.gig_id AS id,
-                   g.user_id,
-                   g.title,
-                   g.description,
-                   c.name AS category,
-                   g.price,
-                   g.created_at
-            FROM gigs AS g
-            JOIN categories AS c ON g.category_id = c.category_id
-            WHERE g.gig_id = %s
-        """
-        cursor.execute(sql, (gig_id,))
-        gig = cursor.fetchone()
-
-        if gig:
-            if isinstance(gig['created_at'], (datetime, date)):
-                gig['created_at'] = gig['created_at'].isoformat()
-            gig['price'] = float(gig['price'])
-            return jsonify(gig), 200
-        else:
-            return jsonify({'message': 'Gig not found'}), 404
+        # Scoped to the gig's version so submit_review can invalidate it.
+        gig = cache.read_through(('gig', gig_id), cache.GIG_TTL, lambda: load_gig(gig_id), namespace=f'gig:{gig_id}')
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
         print(f"Error fetching gig: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+    if gig:
+        return with_etag(jsonify(gig), etag), 200
+    else:
+        return jsonify({'message': 'Gig not found'}), 404
+
+
+def load_categories():
+    with repository.session(get_db_connection) as session:
+        return repository.list_categories(session)
 
 
 # Get all Categories
+# Categories are only edited directly in the database; after such a change run
+# INCR on the categories version key (see cache.make_key) to invalidate clients.
 @app.route('/api/categories', methods=['GET'])
 def get_all_categories():
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
+    version = etag_version('categories')
+    etag = make_etag('categories', version) if version is not None else None
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
 
-    cursor = conn.cursor(dictionary=True)
     try:
-        sql = "SELECT category_id AS id, name FROM categories"
-        cursor.execute(sql)
-        categories = cursor.fetchall()
-        return jsonify(categories), 200
+        categories = cache.read_through(('categories',), cache.CATEGORIES_TTL, load_categories, namespace='categories')
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
         print(f"Error fetching categories: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    return with_etag(jsonify(categories), etag), 200
 
 
 # Create Order
+# Accepts an Idempotency-Key header so retries do not create duplicates (idempotency.py);
+# the same goes for the other POST endpoints that create rows.
 @app.route('/api/orders', methods=['POST'])
+@idempotency.idempotent('orders')
 def create_order():
     data = request.json
     gig_id = data.get('gig_id')
@@ -354,39 +1005,120 @@ def create_order():
     if not all([gig_id, buyer_id, freelancer_id]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        with repository.session(get_db_connection, write=True) as session:
+            order_id = repository.create_order(session, gig_id, buyer_id, freelancer_id, status, order_date)
+            if order_id is None:
+                # Rare path: one more query to tell the client which reference was wrong.
+                message = repository.missing_order_reference(session, gig_id, buyer_id, freelancer_id)
+                return jsonify({'message': message or 'Order could not be created'}), 404
+            analytics.record_orders_created(session.cursor(), {(freelancer_id, order_date): 1})
+        return jsonify({'message': 'Order created successfully', 'order_id': order_id}), 201
+    except DatabaseUnavailable:
         return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error creating order: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT gig_id FROM gigs WHERE gig_id = %s", (gig_id,))
-        if not cursor.fetchone():
-            return jsonify({'message': 'Gig not found'}), 404
 
-        cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (buyer_id,))
-        if not cursor.fetchone():
-            return jsonify({'message': 'Buyer not found'}), 404
+ORDERS_BATCH_MAX = int(os.environ.get('ORDERS_BATCH_MAX', 100))
 
-        cursor.execute("SELECT user_id FROM users WHERE user_id = %s", (freelancer_id,))
-        if not cursor.fetchone():
-            return jsonify({'message': 'Freelancer not found'}), 404
 
-        sql = "INSERT INTO orders (gig_id, buyer_id, freelancer_id, status, order_date) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(sql, (gig_id, buyer_id, freelancer_id, status, order_date))
-        conn.commit()
-        order_id = cursor.lastrowid
-        return jsonify({'message': 'Order created successfully', 'order_id': order_id}), 201
+# Create many Orders in one transaction
+# Body: {"orders": [{"gig_id": 1, "buyer_id": 2, "freelancer_id": 3}, ...]}
+# Returns one result per input order, in the same order, each with its own status.
+@app.route('/api/orders/batch', methods=['POST'])
+@idempotency.idempotent('orders-batch')
+def create_orders_batch():
+    data = request.json or {}
+    items = data.get('orders')
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Missing orders list'}), 400
+    if len(items) > ORDERS_BATCH_MAX:
+        return jsonify({'message': f'At most {ORDERS_BATCH_MAX} orders per batch'}), 400
+
+    results = [None] * len(items)
+    candidates = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all([item.get('gig_id'), item.get('buyer_id'), item.get('freelancer_id')]):
+            results[index] = {'index': index, 'status': 400, 'message': 'Missing required fields'}
+            continue
+        try:
+            # Ids are compared against the integers the lookup query returns.
+            items[index] = {key: int(item[key]) for key in ('gig_id', 'buyer_id', 'freelancer_id')}
+        except (TypeError, ValueError):
+            results[index] = {'index': index, 'status': 400, 'message': 'Invalid id'}
+            continue
+        candidates.append(index)
+
+    if not candidates:
+        return jsonify({'created': 0, 'results': results}), 200
+
+    try:
+        with repository.session(get_db_connection, write=True) as session:
+            cursor = session.cursor()
+            gig_ids = sorted({items[i]['gig_id'] for i in candidates})
+            user_ids = sorted({items[i][key] for i in candidates for key in ('buyer_id', 'freelancer_id')})
+            # Every referenced gig and user, plus the auto-increment step, in one round trip.
+            sql = f"""
+                SELECT 'gig', gig_id FROM gigs WHERE gig_id IN ({', '.join(['%s'] * len(gig_ids))})
+                UNION ALL
+                SELECT 'user', user_id FROM users WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})
+                UNION ALL
+                SELECT 'increment', @@auto_increment_increment
+            """
+            cursor.execute(sql, tuple(gig_ids + user_ids))
+            found = {'gig': set(), 'user': set()}
+            increment = 1
+            for kind, value in cursor.fetchall():
+                if kind == 'increment':
+                    increment = int(value)
+                else:
+                    found[kind].add(value)
+
+            status = 'pending'
+            order_date = datetime.now().date().isoformat()
+            to_insert = []
+            for index in candidates:
+                item = items[index]
+                if item['gig_id'] not in found['gig']:
+                    results[index] = {'index': index, 'status': 404, 'message': 'Gig not found'}
+                elif item['buyer_id'] not in found['user']:
+                    results[index] = {'index': index, 'status': 404, 'message': 'Buyer not found'}
+                elif item['freelancer_id'] not in found['user']:
+                    results[index] = {'index': index, 'status': 404, 'message': 'Freelancer not found'}
+                else:
+                    to_insert.append(index)
+
+            if to_insert:
+                sql = "INSERT INTO orders (gig_id, buyer_id, freelancer_id, status, order_date) VALUES " + \
+                      ', '.join(['(%s, %s, %s, %s, %s)'] * len(to_insert))
+                params = []
+                for index in to_insert:
+                    item = items[index]
+                    params.extend([item['gig_id'], item['buyer_id'], item['freelancer_id'], status, order_date])
+                cursor.execute(sql, tuple(params))
+                # A multi-row INSERT gets consecutive ids (one increment apart) starting at lastrowid.
+                first_id = cursor.lastrowid
+                for position, index in enumerate(to_insert):
+                    results[index] = {'index': index, 'status': 201, 'order_id': first_id + position * increment}
+
+                created = {}
+                for index in to_insert:
+                    key = (items[index]['freelancer_id'], order_date)
+                    created[key] = created.get(key, 0) + 1
+                analytics.record_orders_created(cursor, created)
+        return jsonify({'created': len(to_insert), 'results': results}), 200
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
-        conn.rollback()
-        print(f"Error creating order: {err}")
+        print(f"Error creating orders batch: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # Get Orders by User ID (buyer_id or freelancer_id)
+# Pass stream=1 to stream the list instead of building it in memory.
 @app.route('/api/orders', methods=['GET'])
 def get_orders_by_user():
     user_id = request.args.get('user_id', type=int)
@@ -394,37 +1126,127 @@ def get_orders_by_user():
 
     if not user_id or not user_type:
         return jsonify({'message': 'Missing user_id or user_type parameter'}), 400
+    if user_type not in repository.ORDERS_BY_USER:
+        return jsonify({'message': 'Invalid user_type'}), 400
 
+    if not wants_stream():
+        try:
+            with repository.session(get_db_connection) as session:
+                return jsonify(repository.orders_for_user(session, user_id, user_type)), 200
+        except DatabaseUnavailable:
+            return jsonify({'message': 'Database connection failed'}), 500
+        except mysql.connector.Error as err:
+            print(f"Error fetching orders: {err}")
+            return jsonify({'message': f'Database error: {err}'}), 500
+
+    # The stream owns the connection until the last row is sent, so it cannot live
+    # inside a session block.
     conn = get_db_connection()
     if conn is None:
         return jsonify({'message': 'Database connection failed'}), 500
 
     cursor = conn.cursor(dictionary=True)
     try:
-        if user_type == 'buyer':
-            sql = "SELECT order_id AS id, gig_id, buyer_id, freelancer_id, status, order_date, delivery_date FROM orders WHERE buyer_id = %s ORDER BY order_date DESC"
-        elif user_type == 'freelancer':
-            sql = "SELECT order_id AS id, gig_id, buyer_id, freelancer_id, status, order_date, delivery_date FROM orders WHERE freelancer_id = %s ORDER BY order_date DESC"
-        else:
-            return jsonify({'message': 'Invalid user_type'}), 400
-
-        cursor.execute(sql, (user_id,))
-        orders = cursor.fetchall()
-
-        for order in orders:
-            if isinstance(order['order_date'], (datetime, date)):
-                order['order_date'] = order['order_date'].isoformat()
-            if order['delivery_date'] and isinstance(order['delivery_date'], (datetime, date)):
-                order['delivery_date'] = order['delivery_date'].isoformat()
-            else:
-                order['delivery_date'] = None
-        return jsonify(orders), 200
+        cursor.execute(repository.ORDERS_BY_USER[user_type], (user_id,))
+        response = stream_rows(conn, cursor)
+        conn = cursor = None  # Closed by the stream.
+        return response, 200
     except mysql.connector.Error as err:
         print(f"Error fetching orders: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
     finally:
-        cursor.close()
-        conn.close()
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+DASHBOARD_MAX_ORDERS = int(os.environ.get('DASHBOARD_MAX_ORDERS', 100))
+
+
+# Dashboard: a user's orders with everything the dashboard shows for each one
+# Query parameters: user_id, user_type ('buyer' or 'freelancer'), optional limit.
+# Each order embeds gig_title, gig_price, the counterparty's id and name, the last
+# message, and review status. Three set-based queries are used however many
+# orders there are; X-Has-More is set when the list was cut at limit.
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    user_id = request.args.get('user_id', type=int)
+    user_type = request.args.get('user_type')
+    limit = max(1, min(request.args.get('limit', DASHBOARD_MAX_ORDERS, type=int), DASHBOARD_MAX_ORDERS))
+
+    if not user_id or not user_type:
+        return jsonify({'message': 'Missing user_id or user_type parameter'}), 400
+    if user_type == 'buyer':
+        own_column, counterparty_column = 'buyer_id', 'freelancer_id'
+    elif user_type == 'freelancer':
+        own_column, counterparty_column = 'freelancer_id', 'buyer_id'
+    else:
+        return jsonify({'message': 'Invalid user_type'}), 400
+
+    try:
+        with repository.session(get_db_connection) as session:
+            cursor = session.cursor(dictionary=True)
+            sql = f"""
+                SELECT o.order_id AS id, o.gig_id, o.buyer_id, o.freelancer_id, o.status,
+                       o.order_date, o.delivery_date,
+                       g.title AS gig_title, g.price AS gig_price,
+                       u.user_id AS counterparty_id, u.name AS counterparty_name
+                FROM orders AS o
+                LEFT JOIN gigs AS g ON g.gig_id = o.gig_id
+                LEFT JOIN users AS u ON u.user_id = o.{counterparty_column}
+                WHERE o.{own_column} = %s
+                ORDER BY o.order_date DESC, o.order_id DESC
+                LIMIT %s
+            """
+            cursor.execute(sql, (user_id, limit + 1))
+            orders = cursor.fetchall()
+            has_more = len(orders) > limit
+            orders = orders[:limit]
+            if not orders:
+                return jsonify([]), 200
+
+            order_ids = [order['id'] for order in orders]
+            placeholders = ', '.join(['%s'] * len(order_ids))
+
+            # Last message of every order: newest message_id per order via the (order_id, message_id) index.
+            cursor.execute(f"""
+                SELECT m.order_id, m.message_id AS id, m.sender_id, m.message_text AS message, m.sent_at
+                FROM messages AS m
+                JOIN (
+                    SELECT order_id, MAX(message_id) AS last_id
+                    FROM messages
+                    WHERE order_id IN ({placeholders})
+                    GROUP BY order_id
+                ) AS latest ON latest.last_id = m.message_id
+            """, tuple(order_ids))
+            last_messages = {row.pop('order_id'): row for row in cursor.fetchall()}
+
+            cursor.execute(f"SELECT order_id, reviewer_id, rating FROM reviews WHERE order_id IN ({placeholders})",
+                           tuple(order_ids))
+            reviews = {}
+            for row in cursor.fetchall():
+                reviews.setdefault(row['order_id'], []).append(row)
+
+            for order in orders:
+                order_reviews = reviews.get(order['id'], [])
+                own_review = next((r for r in order_reviews if r['reviewer_id'] == user_id), None)
+                order['last_message'] = last_messages.get(order['id'])
+                order['review'] = {
+                    'reviewed': own_review is not None,
+                    'rating': own_review['rating'] if own_review else None,
+                    'counterparty_reviewed': any(r['reviewer_id'] != user_id for r in order_reviews),
+                }
+
+            response = jsonify(orders)
+            if has_more:
+                response.headers['X-Has-More'] = '1'
+            return response, 200
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error fetching dashboard: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
 
 
 # Update Order Status
@@ -436,73 +1258,140 @@ def update_order_status(order_id):
     if new_status not in ['pending', 'in_progress', 'completed', 'cancelled']:
         return jsonify({'message': 'Invalid status provided'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
-
-    cursor = conn.cursor()
     try:
-        sql = "UPDATE orders SET status = %s WHERE order_id = %s"
-        params = [new_status, order_id]
-        if new_status == 'completed':
-            sql = "UPDATE orders SET status = %s, delivery_date = %s WHERE order_id = %s"
-            params = [new_status, datetime.now().date().isoformat(), order_id]
-
-        cursor.execute(sql, tuple(params))
-        conn.commit()
-        if cursor.rowcount == 0:
-            return jsonify({'message': 'Order not found or no change'}), 404
+        with repository.session(get_db_connection, write=True) as session:
+            cursor = session.cursor()
+            # The order row is locked first so the analytics rollups move it from exactly
+            # the status (and delivery date) it had.
+            order = analytics.lock_order(cursor, order_id)
+            if order is None:
+                return jsonify({'message': 'Order not found or no change'}), 404
+
+            delivery_date = datetime.now().date()
+            changed = repository.update_order_status(
+                session, order_id, new_status,
+                delivery_date.isoformat() if new_status == 'completed' else None)
+            if changed == 0:
+                return jsonify({'message': 'Order not found or no change'}), 404
+            analytics.record_status_change(cursor, order, new_status, delivery_date)
         return jsonify({'message': f'Order {order_id} status updated to {new_status}'}), 200
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
-        conn.rollback()
         print(f"Error updating order status: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+
+MESSAGES_PAGE_SIZE = int(os.environ.get('MESSAGES_PAGE_SIZE', 100))
+MESSAGES_MAX_PAGE_SIZE = int(os.environ.get('MESSAGES_MAX_PAGE_SIZE', 500))
 
 
 # Get Messages by Order ID
+# Query parameters (all optional besides order_id):
+#   since_id  - only messages newer than this id (catch up after a reconnect)
+#   before_id - only messages older than this id (page back through history)
+#   limit     - page size; without since_id/before_id returns the latest `limit` messages
+#   stream    - 1 to stream the whole thread (only without the parameters above)
+# Messages are always returned oldest first. When more messages match than were
+# returned the X-Has-More header is set to 1; continue from the last id (since_id)
+# or the first id (before_id). Paged queries are served by the
+# (order_id, message_id) index from migration 6.
 @app.route('/api/messages', methods=['GET'])
 def get_messages_by_order():
     order_id = request.args.get('order_id', type=int)
     if not order_id:
         return jsonify({'message': 'Missing order_id parameter'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
+    since_id = request.args.get('since_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if since_id is not None and before_id is not None:
+        return jsonify({'message': 'Use either since_id or before_id, not both'}), 400
+    paged = since_id is not None or before_id is not None or limit is not None
+    if paged:
+        limit = max(1, min(limit or MESSAGES_PAGE_SIZE, MESSAGES_MAX_PAGE_SIZE))
+
+    sql = """
+        SELECT message_id AS id,
+               order_id,
+               sender_id,
+               receiver_id,
+               message_text AS message,
+               sent_at
+        FROM messages
+        WHERE order_id = %s
+    """
+    if not paged:
+        sql, params = sql + " ORDER BY sent_at ASC", (order_id,)
+    elif since_id is not None:
+        sql, params = sql + " AND message_id > %s ORDER BY message_id ASC LIMIT %s", (order_id, since_id, limit + 1)
+    elif before_id is not None:
+        sql, params = sql + " AND message_id < %s ORDER BY message_id DESC LIMIT %s", (order_id, before_id, limit + 1)
+    else:
+        sql, params = sql + " ORDER BY message_id DESC LIMIT %s", (order_id, limit + 1)
+
+    if wants_stream() and not paged:
+        # The stream owns the connection until the last row is sent, so it cannot live
+        # inside a session block.
+        conn = get_db_connection()
+        if conn is None:
+            return jsonify({'message': 'Database connection failed'}), 500
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(sql, params)
+        except mysql.connector.Error as err:
+            cursor.close()
+            conn.close()
+            print(f"Error fetching messages: {err}")
+            return jsonify({'message': f'Database error: {err}'}), 500
+        return stream_rows(conn, cursor), 200
 
-    cursor = conn.cursor(dictionary=True)
     try:
-        sql = """
-            SELECT message_id AS id,
-                   order_id,
-                   sender_id,
-                   receiver_id,
-                   message_text AS message,
-                   sent_at
-            FROM messages
-            WHERE order_id = %s
-            ORDER BY sent_at ASC
-        """
-        cursor.execute(sql, (order_id,))
-        messages = cursor.fetchall()
-
-        for msg in messages:
-            if isinstance(msg['sent_at'], datetime):
-                msg['sent_at'] = msg['sent_at'].isoformat()
-        return jsonify(messages), 200
+        with repository.session(get_db_connection) as session:
+            cursor = session.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            messages = cursor.fetchall()
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
         print(f"Error fetching messages: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+    has_more = paged and len(messages) > limit
+    if has_more:
+        messages = messages[:limit]
+    if paged and since_id is None:
+        messages.reverse()
+
+    response = jsonify(messages)
+    if has_more:
+        response.headers['X-Has-More'] = '1'
+    return response, 200
+
+
+def emit_new_message(message_id, order_id, sender_id, receiver_id, message_text, sent_at):
+    with metrics.timer('socketio_emit_duration_seconds', event='new_message'):
+        socketio.emit('new_message', {
+            'id': message_id,
+            'order_id': order_id,
+            'sender_id': sender_id,
+            'receiver_id': receiver_id,
+            'message': message_text,
+            'sent_at': sent_at.isoformat()
+        }, room=str(order_id))
+
+
+@app.before_request
+def start_message_flusher():
+    if write_behind.MESSAGES_WRITE_BEHIND:
+        write_behind.start_flusher(get_db_connection, socketio.start_background_task)
 
 
 # Send Message
+# With MESSAGES_WRITE_BEHIND=1 the message is queued in Redis and written to MySQL
+# in batches by write_behind.py; if Redis is unavailable it is inserted directly.
 @app.route('/api/messages', methods=['POST'])
+@idempotency.idempotent('messages')
 def send_message():
     data = request.json
     order_id = data.get('order_id')
@@ -513,34 +1402,37 @@ def send_message():
     if not all([order_id, sender_id, receiver_id, message_text]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
+    if write_behind.MESSAGES_WRITE_BEHIND:
+        # Checked up front: a queued message has already been answered and broadcast,
+        # so the flusher must never have to drop it.
+        try:
+            with repository.session(get_db_connection) as session:
+                if not repository.order_exists(session, order_id):
+                    return jsonify({'message': 'Order not found'}), 404
+        except DatabaseUnavailable:
+            return jsonify({'message': 'Database connection failed'}), 500
+        except mysql.connector.Error as err:
+            print(f"Error checking order for message: {err}")
+            return jsonify({'message': f'Database error: {err}'}), 500
+
+        queued = write_behind.enqueue(get_db_connection, order_id, sender_id, receiver_id, message_text)
+        if queued:
+            message_id, sent_at = queued
+            emit_new_message(message_id, order_id, sender_id, receiver_id, message_text, sent_at)
+            return jsonify({'message': 'Message sent successfully', 'message_id': message_id}), 201
 
-    cursor = conn.cursor()
     try:
-        sql = "INSERT INTO messages (order_id, sender_id, receiver_id, message_text, sent_at) VALUES (%s, %s, %s, %s, NOW())"
-        cursor.execute(sql, (order_id, sender_id, receiver_id, message_text))
-        conn.commit()
-        message_id = cursor.lastrowid
-
-        socketio.emit('new_message', {
-            'id': message_id,
-            'order_id': order_id,
-            'sender_id': sender_id,
-            'receiver_id': receiver_id,
-            'message': message_text,
-            'sent_at': datetime.now().isoformat()
-        }, room=str(order_id))
-
-        return jsonify({'message': 'Message sent successfully', 'message_id': message_id}), 201
+        with repository.session(get_db_connection, write=True) as session:
+            message_id = repository.create_message(session, order_id, sender_id, receiver_id, message_text)
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
-        conn.rollback()
         print(f"Error sending message: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+    emit_new_message(message_id, order_id, sender_id, receiver_id, message_text, datetime.now())
+
+    return jsonify({'message': 'Message sent successfully', 'message_id': message_id}), 201
 
 
 # Get Reviews by Order ID or Gig ID
@@ -552,41 +1444,25 @@ def get_reviews_by_order():
     if not order_id and not gig_id:
         return jsonify({'message': 'Missing order_id or gig_id parameter'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({'message': 'Database connection failed'}), 500
-
-    cursor = conn.cursor(dictionary=True)
     try:
-        if order_id:
-            sql = "SELECT review_id AS id, order_id, reviewer_id, rating, comment, review_date FROM reviews WHERE order_id = %s ORDER BY review_date DESC"
-            cursor.execute(sql, (order_id,))
-        elif gig_id:
-            sql = """
-                SELECT r.review_id AS id, r.order_id, r.reviewer_id, r.rating, r.comment, r.review_date
-                FROM reviews AS r
-                JOIN orders AS o ON r.order_id = o.order_id
-                WHERE o.gig_id = %s
-                ORDER BY r.review_date DESC
-            """
-            cursor.execute(sql, (gig_id,))
-
-        reviews = cursor.fetchall()
-
-        for review in reviews:
-            if isinstance(review['review_date'], (datetime, date)):
-                review['review_date'] = review['review_date'].isoformat()
-        return jsonify(reviews), 200
+        with repository.session(get_db_connection) as session:
+            validator = repository.reviews_validator(session, order_id, gig_id)
+            etag = make_etag('reviews', order_id, gig_id, validator.total, validator.last_id)
+            cached_response = not_modified(etag)
+            if cached_response:
+                return cached_response
+            reviews = repository.list_reviews(session, order_id, gig_id)
+        return with_etag(jsonify(reviews), etag), 200
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
         print(f"Error fetching reviews: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # Submit Review
 @app.route('/api/reviews', methods=['POST'])
+@idempotency.idempotent('reviews')
 def submit_review():
     data = request.json
     order_id = data.get('order_id')
@@ -600,55 +1476,185 @@ def submit_review():
     if not (1 <= rating <= 5):
         return jsonify({'message': 'Rating must be between 1 and 5'}), 400
 
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        with repository.session(get_db_connection, write=True) as session:
+            if repository.has_reviewed(session, order_id, reviewer_id):
+                return jsonify({'message': 'You have already reviewed this order'}), 409
+
+            order = repository.get_order_gig_and_freelancer(session, order_id)
+            if not order:
+                return jsonify({'message': 'Order not found'}), 404
+            gig_id, freelancer_id = order
+
+            review_id = repository.create_review(session, order_id, reviewer_id, rating, comment, review_date)
+            # Same transaction, so the summaries never disagree with the reviews table.
+            ratings.record_review(session.cursor(), gig_id, freelancer_id, rating)
+    except DatabaseUnavailable:
         return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error submitting review: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
 
-    cursor = conn.cursor()
+    cache.bump_version('gigs')
+    cache.bump_version(f'gig:{gig_id}')
+    return jsonify({'message': 'Review submitted successfully', 'review_id': review_id}), 201
+
+
+# Get a Freelancer's rating summary
+@app.route('/api/users/<int:user_id>/rating', methods=['GET'])
+def get_freelancer_rating(user_id):
+    try:
+        with repository.session(get_db_connection) as session:
+            return jsonify(repository.get_freelancer_rating(session, user_id)), 200
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
+    except mysql.connector.Error as err:
+        print(f"Error fetching rating summary: {err}")
+        return jsonify({'message': f'Database error: {err}'}), 500
+
+
+ANALYTICS_DEFAULT_DAYS = int(os.environ.get('ANALYTICS_DEFAULT_DAYS', 90))
+ANALYTICS_MAX_DAYS = int(os.environ.get('ANALYTICS_MAX_DAYS', 1096))
+
+
+# Get a Freelancer's order analytics
+# Query parameters: from, to - ISO dates (default: the last ANALYTICS_DEFAULT_DAYS days).
+# Returns totals for the range (orders placed and their current status, deliveries,
+# earnings, average days to completion) plus one entry per day with activity.
+# Served from the freelancer_daily_stats rollup (analytics.py).
+@app.route('/api/users/<int:user_id>/analytics', methods=['GET'])
+def get_freelancer_analytics(user_id):
     try:
-        sql_check = "SELECT review_id FROM reviews WHERE order_id = %s AND reviewer_id = %s"
-        cursor.execute(sql_check, (order_id, reviewer_id))
-        if cursor.fetchone():
-            return jsonify({'message': 'You have already reviewed this order'}), 409
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.now().date()
+        start = (date.fromisoformat(request.args['from']) if request.args.get('from')
+                 else end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1))
+    except ValueError:
+        return jsonify({'message': 'from and to must be dates (YYYY-MM-DD)'}), 400
+    if start > end or (end - start).days >= ANALYTICS_MAX_DAYS:
+        return jsonify({'message': f'from must not be after to, and the range is limited to {ANALYTICS_MAX_DAYS} days'}), 400
 
-        sql_insert = "INSERT INTO reviews (order_id, reviewer_id, rating, comment, review_date) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(sql_insert, (order_id, reviewer_id, rating, comment, review_date))
-        conn.commit()
-        review_id = cursor.lastrowid
-        return jsonify({'message': 'Review submitted successfully', 'review_id': review_id}), 201
+    try:
+        with repository.session(get_db_connection) as session:
+            rows = repository.freelancer_daily_stats(session, user_id, start, end)
+        return jsonify(analytics.summarize(user_id, start, end, rows)), 200
+    except DatabaseUnavailable:
+        return jsonify({'message': 'Database connection failed'}), 500
     except mysql.connector.Error as err:
-        conn.rollback()
-        print(f"Error submitting review: {err}")
+        print(f"Error fetching analytics: {err}")
         return jsonify({'message': f'Database error: {err}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 # --- Database Test Endpoint (Useful for debugging deployment) ---
 @app.route('/api/test_db', methods=['GET'])
 def test_db_connection():
-    conn = None
     try:
-        conn = get_db_connection()
-        if conn is None:
-            return jsonify({'status': 'error', 'message': 'Failed to connect to database. Check environment variables and database availability.'}), 500
-        cursor = conn.cursor()
-        sql = "SELECT COUNT(*) FROM users"
-        cursor.execute(sql)
-        user_count = cursor.fetchone()[0]
-        cursor.close()
+        with repository.session(get_db_connection) as session:
+            cursor = session.cursor()
+            sql = "SELECT COUNT(*) FROM users"
+            cursor.execute(sql)
+            user_count = cursor.fetchone()[0]
         return jsonify({
             'status': 'success',
             'message': 'Successfully connected to Freelancerrr database!',
-            'users_in_db': user_count
+            'users_in_db': user_count,
+            'pool': db.pool_stats(),
+            'admission': admission.admission_stats(),
+            'compression_cache': compression.cache_stats()
         }), 200
+    except DatabaseUnavailable:
+        return jsonify({'status': 'error', 'message': 'Failed to connect to database. Check environment variables and database availability.'}), 500
     except mysql.connector.Error as err:
         print(f"Error during database test: {err}")
         return jsonify({'status': 'error', 'message': f'Database error: {err}'}), 500
+
+
+# --- CLI Commands ---
+# flask --app app migrate          apply pending schema migrations (migrations.py)
+# flask --app app rebuild-ratings  recompute the rating summaries from scratch
+# flask --app app rebuild-analytics [--since YYYY-MM-DD]  backfill the order analytics rollups
+# flask --app app rebuild-similar-gigs  recompute the similar gigs index on this host
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    try:
+        applied = migrations.migrate(conn)
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+        # Tables that summarise existing rows start out empty; fill them in the same release.
+        backfills = [(1, 'rating summaries', ratings.rebuild), (5, 'analytics rollups', analytics.rebuild)]
+        for version, name, rebuild in backfills:
+            if version in applied:
+                cursor = conn.cursor()
+                try:
+                    rebuild(cursor)
+                    conn.commit()
+                    print(f"Backfilled {name}.")
+                finally:
+                    cursor.close()
     finally:
-        if conn:
-            conn.close()
+        conn.close()
+
+
+@app.cli.command('rebuild-ratings')
+def rebuild_ratings_command():
+    """Recompute gig and freelancer rating summaries from the reviews table."""
+    try:
+        with repository.session(get_db_connection, write=True) as session:
+            cursor = session.cursor()
+            ratings.rebuild(cursor)
+            cursor.execute("SELECT gig_id FROM gig_rating_summary")
+            gig_ids = [gig_id for (gig_id,) in cursor.fetchall()]
+    except DatabaseUnavailable:
+        raise click.ClickException('Database connection failed')
+    cache.bump_version('gigs')
+    for gig_id in gig_ids:
+        cache.bump_version(f'gig:{gig_id}')
+    print("Rating summaries rebuilt.")
+
+
+@app.cli.command('rebuild-analytics')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Only recompute days on or after this date.')
+def rebuild_analytics_command(since):
+    """Recompute the freelancer analytics rollups from the orders table."""
+    try:
+        with repository.session(get_db_connection, write=True) as session:
+            analytics.rebuild(session.cursor(), since.date() if since else None)
+    except DatabaseUnavailable:
+        raise click.ClickException('Database connection failed')
+    print("Analytics rollups rebuilt" + (f" from {since.date()}." if since else "."))
+
+
+@app.cli.command('rebuild-similar-gigs')
+def rebuild_similar_gigs_command():
+    """Recompute every vector of the similar gigs index from the gigs table."""
+    if not similar_gigs.available():
+        raise click.ClickException('NumPy is not installed')
+    conn = get_db_connection()
+    if conn is None:
+        raise click.ClickException('Database connection failed')
+    cursor = conn.cursor()
+    try:
+        similar_gigs.rebuild(cursor)
+        print(f"Similar gigs index rebuilt in {similar_gigs.SIMILAR_GIGS_DIR}.")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# Prometheus metrics for all workers (scrape target)
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if metrics.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {metrics.METRICS_TOKEN}':
+        return jsonify({'message': 'Unauthorized'}), 401
+    if not metrics.METRICS_ENABLED:
+        return jsonify({'message': 'Metrics are disabled'}), 404
+    body = metrics.render()
+    if body is None:
+        return jsonify({'message': 'Metrics store (Redis) is unavailable'}), 503
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
 
 
 # --- SocketIO Event Handlers ---
@@ -666,7 +1672,8 @@ def on_join(data):
     from flask_socketio import join_room
     join_room(str(order_id))
     print(f"Client joined room: {order_id}")
-    emit('status', {'msg': f'Joined order room: {order_id}'})
+    with metrics.timer('socketio_emit_duration_seconds', event='status'):
+        emit('status', {'msg': f'Joined order room: {order_id}'})
 
 
 # --- Main execution block ---
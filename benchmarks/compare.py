@@ -0,0 +1,64 @@
+"""Compares two saved benchmark runs scenario by scenario.
+
+    python -m benchmarks.compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+Changes in throughput and p50/p95/p99 are shown as percentages of the old run.
+Latency changes beyond --threshold percent are marked with '!' (slower) or '+'
+(faster), so a regression in e.g. get_all_gigs or the pool shows up at a glance.
+"""
+import argparse
+import json
+
+METRICS = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r['scenario'], r['concurrency']): r for r in report['results']}
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def describe(report):
+    git = report.get('git') or {}
+    dirty = ' (dirty)' if git.get('dirty') else ''
+    return f"{git.get('commit')}{dirty} {report.get('created_at')} {report.get('label') or ''}".strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change worth flagging')
+    args = parser.parse_args()
+
+    old_report, old = load(args.old)
+    new_report, new = load(args.new)
+    print(f"old: {describe(old_report)}")
+    print(f"new: {describe(new_report)}")
+    if old_report.get('dataset') != new_report.get('dataset'):
+        print(f"warning: the runs used different datasets: {old_report.get('dataset')} vs {new_report.get('dataset')}")
+
+    print(f"{'scenario':<20} {'c':>4} " + ' '.join(f"{m:>22}" for m in METRICS))
+    for key in sorted(set(old) & set(new)):
+        cells = []
+        for metric in METRICS:
+            pct = change(old[key][metric], new[key][metric])
+            flag = ' '
+            if pct is not None and abs(pct) >= args.threshold:
+                worse = pct < 0 if metric == 'throughput' else pct > 0
+                flag = '!' if worse else '+'
+            pct_text = f"{pct:+.1f}%" if pct is not None else 'n/a'
+            cells.append(f"{old[key][metric]}->{new[key][metric]} {pct_text}{flag}".rjust(22))
+        print(f"{key[0]:<20} {key[1]:>4} " + ' '.join(cells))
+    for key in sorted(set(old) ^ set(new)):
+        print(f"{key[0]:<20} {key[1]:>4} only in {'old' if key in old else 'new'} run")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Query-plan regression check: EXPLAINs every statement the API runs and fails on scans.
+
+    python -m benchmarks.seed --gigs 20000 --orders 100000   # the data size to check at
+    python -m benchmarks.explain --min-rows 1000
+
+Run from the repository root against the seeded database (it is written to).
+Every benchmark scenario, plus the paging and streaming variants below, is sent
+through Flask's test client with the Redis cache disabled. Each distinct
+statement the handlers execute is captured with its parameters through
+db.instrumentation and EXPLAINed. A statement fails the check when a step of its
+plan is a full table scan (type ALL) or a filesort over at least --min-rows
+estimated rows, unless its endpoint is listed in ALLOWED_SCANS. The exit status
+is 1 when anything failed, so the check can gate CI.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+os.environ['CACHE_ENABLED'] = '0'
+os.environ['METRICS_ENABLED'] = '0'
+
+import mysql.connector  # noqa: E402
+
+import app  # noqa: E402
+import db  # noqa: E402
+import metrics  # noqa: E402
+from benchmarks import run  # noqa: E402
+
+# Endpoints whose scans are expected, with the reason.
+ALLOWED_SCANS = {
+    'get_gig_facets': 'aggregates over every gig by design; the response is cached',
+    'test_db_connection': 'COUNT(*) over users is the health check itself',
+    'get_similar_gigs': 'the first lookup on a host builds the similar gigs index from every gig',
+}
+
+# Requests beyond the benchmark scenarios, to reach the other statement variants.
+EXTRA_REQUESTS = [
+    ('GET', '/api/gigs?stream=1'),
+    ('GET', '/api/gigs?limit=5&fields=id,title,price'),
+    ('GET', '/api/messages?order_id={order_id}&limit=20'),
+    ('GET', '/api/messages?order_id={order_id}&since_id=1&limit=20'),
+    ('GET', '/api/messages?order_id={order_id}&before_id=1000000000&limit=20'),
+    ('GET', '/api/messages?order_id={order_id}&stream=1'),
+    ('GET', '/api/orders?user_id={freelancer_id}&user_type=freelancer&stream=1'),
+    ('GET', '/api/dashboard?user_id={freelancer_id}&user_type=freelancer'),
+    ('GET', '/api/users/{freelancer_id}/analytics?from=2020-01-01'),
+]
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+
+class StatementRecorder:
+    """db.instrumentation hook that keeps the first execution of each distinct statement."""
+
+    def __init__(self):
+        self.statements = {}  # normalized sql -> (endpoint, sql, params)
+
+    def observe_query(self, sql, params, seconds):
+        self.statements.setdefault(metrics.normalize_statement(sql), (metrics.current_endpoint(), sql, params))
+
+    def observe_rows(self, sql, count):
+        pass
+
+
+def drive(client, dataset, samples, seed):
+    rng = random.Random(seed)
+    for scenario in run.SCENARIOS:
+        for _ in range(samples):
+            path, body = scenario.build(rng, dataset)
+            client.open(path, method=scenario.method, json=body).get_data()
+
+    order_id, _, _, freelancer_id = dataset['orders_sample'][0]
+    for method, path in EXTRA_REQUESTS:
+        client.open(path.format(order_id=order_id, freelancer_id=freelancer_id), method=method).get_data()
+    next_cursor = client.get('/api/gigs?limit=5').headers.get('X-Next-Cursor')
+    if next_cursor:
+        client.get(f'/api/gigs?limit=5&cursor={next_cursor}').get_data()
+
+
+def is_explainable(sql):
+    verb = sql.lstrip().split(None, 1)[0].upper()
+    return verb in EXPLAINABLE or (verb == 'INSERT' and ' SELECT ' in f" {sql.upper()} ")
+
+
+def problems(plan, min_rows):
+    found = []
+    for step in plan:
+        rows = int(step.get('rows') or 0)
+        table = step.get('table') or ''
+        if table.startswith('<') or rows < min_rows:
+            continue  # derived/union results are judged by the steps that build them
+        if step.get('type') == 'ALL':
+            found.append(f"full scan of {table} (~{rows} rows)")
+        if 'Using filesort' in (step.get('Extra') or ''):
+            found.append(f"filesort on {table} (~{rows} rows)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='estimated rows from which a scan or filesort fails the check')
+    parser.add_argument('--samples', type=int, default=3, help='requests per scenario')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    with open(run.DATASET_FILE) as f:
+        dataset = json.load(f)
+
+    recorder = StatementRecorder()
+    db.instrumentation = recorder
+    drive(app.app.test_client(), dataset, args.samples, args.seed)
+    db.instrumentation = None
+
+    conn = mysql.connector.connect(host=db.DB_HOST, port=db.DB_PORT, user=db.DB_USER,
+                                   password=db.DB_PASSWORD, database=db.DB_NAME)
+    cursor = conn.cursor(dictionary=True)
+    checked = failed = 0
+    try:
+        for normalized, (endpoint, sql, params) in sorted(recorder.statements.items(), key=lambda s: s[1][0]):
+            if not is_explainable(sql):
+                continue
+            checked += 1
+            try:
+                cursor.execute(f"EXPLAIN {sql}", params or ())
+                plan = cursor.fetchall()
+            except mysql.connector.Error as err:
+                print(f"? {endpoint}: cannot EXPLAIN ({err}): {normalized[:200]}")
+                continue
+            finally:
+                conn.rollback()
+            found = problems(plan, args.min_rows)
+            allowed = ALLOWED_SCANS.get(endpoint)
+            if found and not allowed:
+                failed += 1
+            if found or args.verbose:
+                mark = 'FAIL' if found and not allowed else ('allowed' if found else 'ok')
+                print(f"{mark} {endpoint} {metrics.statement_label(sql)}: {'; '.join(found) or 'no scans'}")
+                if allowed and found:
+                    print(f"     ({allowed})")
+                print(f"     {normalized[:300]}")
+                if args.verbose:
+                    for step in plan:
+                        print(f"       {step.get('table')}: type={step.get('type')} key={step.get('key')} "
+                              f"rows={step.get('rows')} extra={step.get('Extra')}")
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"{checked} statements explained, {failed} failed (min rows {args.min_rows}).")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
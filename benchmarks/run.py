@@ -0,0 +1,327 @@
+"""Load-tests every API route (and Socket.IO room fan-out) against a running server.
+
+    python -m benchmarks.seed                      # once per run, for identical data
+    gunicorn -c gunicorn.conf.py app:app &         # the server under test, as in the Procfile
+    python -m benchmarks.run --base-url http://127.0.0.1:8000 --concurrency 1,8,32
+
+Run from the repository root. Each scenario runs for --duration seconds per
+concurrency level, with request parameters drawn from a fixed --seed over the
+dataset described by benchmarks/dataset.json. Throughput and p50/p95/p99
+latency are printed and saved to benchmarks/results/<time>-<commit>.json;
+compare two result files with python -m benchmarks.compare OLD NEW.
+Writing scenarios change the data, so re-seed before each run you want to
+compare.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATASET_FILE = os.path.join(HERE, 'dataset.json')
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+
+class Scenario:
+    def __init__(self, name, method, build, ok=(200,)):
+        self.name = name
+        self.method = method
+        self.build = build  # build(rng, dataset) -> (path, json body or None)
+        self.ok = ok
+
+
+def pick_order(rng, ds):
+    return rng.choice(ds['orders_sample'])
+
+
+def ids_param(rng, upper, count=20):
+    return ','.join(str(rng.randrange(upper) + 1) for _ in range(count))
+
+
+_review_targets = itertools.count()
+_unique = itertools.count()
+RUN_ID = f"{int(time.time())}-{os.getpid()}"
+
+
+def next_review(rng, ds):
+    # Each unreviewed order is reviewed once; afterwards the server answers 409.
+    order_id, _, buyer_id, _ = ds['unreviewed_orders'][next(_review_targets) % len(ds['unreviewed_orders'])]
+    return '/api/reviews', {'order_id': order_id, 'reviewer_id': buyer_id, 'rating': rng.randrange(1, 6),
+                            'comment': 'benchmark review'}
+
+
+def new_order(rng, ds):
+    _, gig_id, buyer_id, freelancer_id = pick_order(rng, ds)
+    return {'gig_id': gig_id, 'buyer_id': buyer_id, 'freelancer_id': freelancer_id}
+
+
+def new_message(rng, ds):
+    order_id, _, buyer_id, freelancer_id = pick_order(rng, ds)
+    return '/api/messages', {'order_id': order_id, 'sender_id': buyer_id, 'receiver_id': freelancer_id,
+                             'message': ' '.join(rng.choices(ds['words'], k=12))}
+
+
+SCENARIOS = [
+    Scenario('home', 'GET', lambda rng, ds: ('/', None)),
+    Scenario('register', 'POST', lambda rng, ds: ('/api/register', {
+        'name': 'Bench User', 'email': f"bench-{RUN_ID}-{next(_unique)}@bench.test",
+        'password': ds['password'], 'user_type': rng.choice(['buyer', 'freelancer'])}), ok=(201,)),
+    Scenario('login', 'POST', lambda rng, ds: ('/api/login', {
+        'email': f"user{rng.randrange(ds['users']) + 1}@bench.test", 'password': ds['password']})),
+    Scenario('users_by_ids', 'GET', lambda rng, ds: (f"/api/users?ids={ids_param(rng, ds['users'])}", None)),
+    Scenario('user', 'GET', lambda rng, ds: (f"/api/users/{rng.randrange(ds['users']) + 1}", None)),
+    Scenario('user_rating', 'GET', lambda rng, ds: (f"/api/users/{rng.choice(ds['freelancers'])}/rating", None)),
+    # The seeded orders fall in 2024 (deliveries up to 30 days later), outside the default last-90-days range.
+    Scenario('user_analytics', 'GET', lambda rng, ds: (f"/api/users/{rng.choice(ds['freelancers'])}/analytics?" + urlencode({
+        'from': '2024-01-01', 'to': '2025-01-31'}), None)),
+    Scenario('gig_create', 'POST', lambda rng, ds: ('/api/gigs', {
+        'user_id': rng.choice(ds['freelancers']), 'title': ' '.join(rng.sample(ds['words'], 5)),
+        'description': ' '.join(rng.choices(ds['words'], k=40)), 'category': rng.choice(ds['categories']),
+        'price': round(rng.uniform(5, 1500), 2)}), ok=(201,)),
+    Scenario('gigs_list', 'GET', lambda rng, ds: ('/api/gigs', None)),
+    Scenario('gigs_list_filtered', 'GET', lambda rng, ds: ('/api/gigs?' + urlencode({
+        'category': rng.choice(ds['categories']), 'min_price': rng.choice([0, 50, 200]),
+        'max_price': rng.choice([300, 800, 2000])}), None)),
+    Scenario('gigs_by_ids', 'GET', lambda rng, ds: (f"/api/gigs?ids={ids_param(rng, ds['gigs'])}", None)),
+    Scenario('gig_facets', 'GET', lambda rng, ds: ('/api/gigs/facets', None)),
+    Scenario('gig_search', 'GET', lambda rng, ds: ('/api/gigs/search?' + urlencode({
+        'q': ' '.join(rng.sample(ds['words'], 2))}), None)),
+    Scenario('gig', 'GET', lambda rng, ds: (f"/api/gigs/{rng.randrange(ds['gigs']) + 1}", None)),
+    Scenario('gig_similar', 'GET', lambda rng, ds: (f"/api/gigs/{rng.randrange(ds['gigs']) + 1}/similar", None)),
+    Scenario('categories', 'GET', lambda rng, ds: ('/api/categories', None)),
+    Scenario('order_create', 'POST', lambda rng, ds: ('/api/orders', new_order(rng, ds)), ok=(201,)),
+    Scenario('orders_batch', 'POST', lambda rng, ds: ('/api/orders/batch', {
+        'orders': [new_order(rng, ds) for _ in range(10)]}), ok=(200,)),
+    Scenario('orders', 'GET', lambda rng, ds: ('/api/orders?' + urlencode(rng.choice([
+        {'user_id': rng.choice(ds['buyers']), 'user_type': 'buyer'},
+        {'user_id': rng.choice(ds['freelancers']), 'user_type': 'freelancer'}])), None)),
+    Scenario('dashboard', 'GET', lambda rng, ds: ('/api/dashboard?' + urlencode({
+        'user_id': rng.choice(ds['buyers']), 'user_type': 'buyer'}), None)),
+    Scenario('order_status', 'PUT', lambda rng, ds: (f"/api/orders/{pick_order(rng, ds)[0]}/status", {
+        'status': rng.choice(['pending', 'in_progress', 'completed'])}), ok=(200, 404)),
+    Scenario('messages', 'GET', lambda rng, ds: (f"/api/messages?order_id={pick_order(rng, ds)[0]}", None)),
+    Scenario('message_send', 'POST', new_message, ok=(201,)),
+    Scenario('reviews', 'GET', lambda rng, ds: (f"/api/reviews?order_id={pick_order(rng, ds)[0]}", None)),
+    Scenario('reviews_by_gig', 'GET', lambda rng, ds: (f"/api/reviews?gig_id={pick_order(rng, ds)[1]}", None)),
+    # 409 once the unreviewed orders run out; the status counts show how many.
+    Scenario('review_submit', 'POST', next_review, ok=(201, 409)),
+    Scenario('test_db', 'GET', lambda rng, ds: ('/api/test_db', None)),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile.
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def summarize(name, concurrency, latencies, statuses, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': ms(latencies[-1]) if latencies else None,
+        'statuses': dict(Counter(statuses)),
+    }
+
+
+def send(base_url, method, path, body, timeout):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    if data is not None:
+        req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as err:
+        err.read()
+        return err.code
+
+
+def run_http(scenario, concurrency, duration, args, dataset):
+    """Runs scenario with concurrency client threads for duration seconds."""
+    latencies, statuses = [], []
+    errors = 0
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def client(index):
+        nonlocal errors
+        rng = random.Random(f"{args.seed}-{scenario.name}-{concurrency}-{index}")
+        mine, my_statuses, my_errors = [], [], 0
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            path, body = scenario.build(rng, dataset)
+            began = time.perf_counter()
+            try:
+                status = send(args.base_url, scenario.method, path, body, args.timeout)
+            except OSError:
+                my_errors += 1
+                continue
+            my_statuses.append(status)
+            if status in scenario.ok:
+                mine.append(time.perf_counter() - began)
+            else:
+                my_errors += 1
+        with lock:
+            latencies.extend(mine)
+            statuses.extend(my_statuses)
+            errors += my_errors
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    began = time.perf_counter()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    return summarize(scenario.name, concurrency, latencies, statuses, errors, time.perf_counter() - began)
+
+
+def run_fanout(listeners, args, dataset):
+    """Joins `listeners` Socket.IO clients to one order room and times delivery of posted messages."""
+    import socketio  # python-socketio client; needs the requests and websocket-client packages
+
+    order_id, _, buyer_id, freelancer_id = dataset['orders_sample'][0]
+    sent, received = {}, []
+    lock = threading.Lock()
+    clients = []
+
+    def on_message(data):
+        text = data.get('message', '')
+        if text.startswith('bench-fanout-'):
+            arrived = time.perf_counter()
+            with lock:
+                received.append(arrived - sent.get(text, arrived))
+
+    for _ in range(listeners):
+        client = socketio.Client(reconnection=False)
+        client.on('new_message', on_message)
+        client.connect(args.base_url, wait_timeout=args.timeout)
+        client.emit('join_order_room', {'order_id': order_id})
+        clients.append(client)
+    time.sleep(1)  # let every join land before the first message
+
+    began = time.perf_counter()
+    errors = 0
+    for i in range(args.fanout_messages):
+        text = f"bench-fanout-{i}-{random.random()}"
+        sent[text] = time.perf_counter()
+        status = send(args.base_url, 'POST', '/api/messages',
+                      {'order_id': order_id, 'sender_id': buyer_id, 'receiver_id': freelancer_id, 'message': text},
+                      args.timeout)
+        if status != 201:
+            errors += 1
+    expected = listeners * (args.fanout_messages - errors)
+    wait_until = time.perf_counter() + args.timeout
+    while len(received) < expected and time.perf_counter() < wait_until:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - began
+    for client in clients:
+        client.disconnect()
+    errors += expected - len(received)
+    return summarize('socketio_fanout', listeners, received, [], errors, elapsed)
+
+
+def git_info():
+    def git(*cmd):
+        try:
+            return subprocess.check_output(('git',) + cmd, cwd=HERE, stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', '--short', 'HEAD'), 'subject': git('log', '-1', '--format=%s'),
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def print_result(result):
+    print(f"{result['scenario']:<20} c={result['concurrency']:<4} {result['throughput']:>9.1f} req/s  "
+          f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms  errors={result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma separated concurrency levels')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario and concurrency level')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds of unrecorded load before each scenario')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--only', help='comma separated scenario names (socketio_fanout included)')
+    parser.add_argument('--fanout-messages', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default='', help='free text stored with the results')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+
+    with open(DATASET_FILE) as f:
+        dataset = json.load(f)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+
+    results = []
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        if args.warmup:
+            run_http(scenario, levels[0], args.warmup, args, dataset)
+        for level in levels:
+            result = run_http(scenario, level, args.duration, args, dataset)
+            print_result(result)
+            results.append(result)
+
+    if not only or 'socketio_fanout' in only:
+        try:
+            for level in levels:
+                result = run_fanout(level, args, dataset)
+                print_result(result)
+                results.append(result)
+        except ImportError as err:
+            print(f"Skipping socketio_fanout: {err}")
+
+    if args.no_save:
+        return
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'git': git_info(),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {k: v for k, v in vars(args).items() if k != 'no_save'},
+        'dataset': {k: dataset[k] for k in ('seed', 'users', 'gigs', 'orders', 'messages', 'reviews')},
+        'results': results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{report['git']['commit'] or 'nogit'}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+-- Base schema for a local benchmark database (python -m benchmarks.seed applies it).
+-- Mirrors the production tables the API reads and writes; indexes beyond the
+-- primary and foreign keys come from migrations.py, which the seeder runs next.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    user_type VARCHAR(20) NOT NULL,
+    created_at DATE NOT NULL
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS categories (
+    category_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS gigs (
+    gig_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    category_id INT NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id),
+    FOREIGN KEY (category_id) REFERENCES categories (category_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    gig_id INT NOT NULL,
+    buyer_id INT NOT NULL,
+    freelancer_id INT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    order_date DATE NOT NULL,
+    delivery_date DATE NULL,
+    FOREIGN KEY (gig_id) REFERENCES gigs (gig_id),
+    FOREIGN KEY (buyer_id) REFERENCES users (user_id),
+    FOREIGN KEY (freelancer_id) REFERENCES users (user_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    sender_id INT NOT NULL,
+    receiver_id INT NOT NULL,
+    message_text TEXT NOT NULL,
+    sent_at DATETIME NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders (order_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS reviews (
+    review_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    reviewer_id INT NOT NULL,
+    rating TINYINT NOT NULL,
+    comment TEXT,
+    review_date DATE NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders (order_id)
+) ENGINE=InnoDB;
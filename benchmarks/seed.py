@@ -0,0 +1,170 @@
+"""Seeds a local MariaDB/MySQL database with a synthetic, reproducible dataset.
+
+    python -m benchmarks.seed --users 2000 --gigs 5000 --orders 20000
+
+Run from the repository root; the DB_* environment variables from db.py pick
+the database. Existing rows in the API's tables are DELETED, so never point
+this at a real database. The same arguments and --seed always produce the same
+rows, and the shape of the dataset is written to benchmarks/dataset.json for
+benchmarks/run.py.
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+import analytics
+import db
+import migrations
+import ratings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(HERE, 'schema.sql')
+DATASET_FILE = os.path.join(HERE, 'dataset.json')
+
+PASSWORD = 'benchpass'
+BATCH_SIZE = 1000
+SAMPLE_SIZE = 2000
+START = datetime(2024, 1, 1)
+
+CATEGORIES = ['Web Development', 'Mobile Apps', 'Graphic Design', 'Logo Design', 'Writing', 'Translation',
+              'Video Editing', 'Music', 'Data Entry', 'Marketing', 'SEO', 'Data Science']
+WORDS = ('website landing page react flask python django api backend frontend logo brand identity '
+         'illustration poster flyer article blog copywriting proofreading translate spanish french '
+         'german video edit youtube intro animation podcast mix master excel spreadsheet scraping '
+         'dashboard analytics seo audit keyword marketing campaign social media wordpress shopify '
+         'android ios app design figma prototype database mysql cloud deploy fast professional').split()
+STATUSES = ['pending', 'in_progress', 'completed', 'completed', 'cancelled']
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def apply_schema(cursor):
+    with open(SCHEMA_FILE) as f:
+        statements = [s.strip() for s in f.read().split(';')]
+    for statement in statements:
+        lines = [line for line in statement.splitlines() if not line.startswith('--')]
+        if any(line.strip() for line in lines):
+            cursor.execute('\n'.join(lines))
+
+
+def insert(conn, cursor, table, columns, rows):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+        conn.commit()
+    print(f"  {table}: {len(rows)} rows")
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    users, gigs, orders, messages, reviews = [], [], [], [], []
+
+    freelancers, buyers = [], []
+    for user_id in range(1, args.users + 1):
+        user_type = 'freelancer' if user_id % 2 else 'buyer'
+        (freelancers if user_type == 'freelancer' else buyers).append(user_id)
+        joined = START + timedelta(days=rng.randrange(365))
+        users.append((user_id, f"User {user_id}", f"user{user_id}@bench.test", PASSWORD, user_type, joined.date()))
+
+    gig_owner = {}
+    for gig_id in range(1, args.gigs + 1):
+        owner = rng.choice(freelancers)
+        gig_owner[gig_id] = owner
+        created = START + timedelta(seconds=rng.randrange(365 * 86400))
+        gigs.append((gig_id, owner, words(rng, 5).title(), words(rng, 40), rng.randrange(len(CATEGORIES)) + 1,
+                     round(rng.uniform(5, 1500), 2), created))
+
+    unreviewed = []
+    for order_id in range(1, args.orders + 1):
+        gig_id = rng.randrange(args.gigs) + 1
+        buyer_id = rng.choice(buyers)
+        freelancer_id = gig_owner[gig_id]
+        status = rng.choice(STATUSES)
+        ordered = START + timedelta(days=rng.randrange(365))
+        delivered = (ordered + timedelta(days=rng.randrange(1, 30))).date() if status == 'completed' else None
+        orders.append((order_id, gig_id, buyer_id, freelancer_id, status, ordered.date(), delivered))
+
+        sent_at = ordered
+        for i in range(rng.randrange(args.messages_per_order * 2 + 1)):
+            sender, receiver = (buyer_id, freelancer_id) if i % 2 == 0 else (freelancer_id, buyer_id)
+            sent_at += timedelta(minutes=rng.randrange(1, 600))
+            messages.append((order_id, sender, receiver, words(rng, rng.randrange(3, 25)), sent_at))
+
+        if status == 'completed' and rng.random() < args.review_ratio:
+            reviews.append((order_id, buyer_id, rng.choice([3, 4, 4, 5, 5, 5]), words(rng, 12), delivered))
+        else:
+            unreviewed.append(order_id)
+
+    dataset = {
+        'seed': args.seed,
+        'users': args.users,
+        'gigs': args.gigs,
+        'orders': args.orders,
+        'messages': len(messages),
+        'reviews': len(reviews),
+        'categories': CATEGORIES,
+        'words': WORDS,
+        'password': PASSWORD,
+        'freelancers': freelancers[:SAMPLE_SIZE],
+        'buyers': buyers[:SAMPLE_SIZE],
+        # (order_id, gig_id, buyer_id, freelancer_id) for a sample of orders.
+        'orders_sample': [list(o[:4]) for o in rng.sample(orders, min(SAMPLE_SIZE, len(orders)))],
+        # Orders its buyer has not reviewed yet, for the review-submitting scenario.
+        'unreviewed_orders': [list(orders[i - 1][:4]) for i in unreviewed[:SAMPLE_SIZE * 5]],
+    }
+    return dataset, [
+        ('categories', ('category_id', 'name'), [(i + 1, name) for i, name in enumerate(CATEGORIES)]),
+        ('users', ('user_id', 'name', 'email', 'password', 'user_type', 'created_at'), users),
+        ('gigs', ('gig_id', 'user_id', 'title', 'description', 'category_id', 'price', 'created_at'), gigs),
+        ('orders', ('order_id', 'gig_id', 'buyer_id', 'freelancer_id', 'status', 'order_date', 'delivery_date'),
+         orders),
+        ('messages', ('order_id', 'sender_id', 'receiver_id', 'message_text', 'sent_at'), messages),
+        ('reviews', ('order_id', 'reviewer_id', 'rating', 'comment', 'review_date'), reviews),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--gigs', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--messages-per-order', type=int, default=5, help='average messages per order')
+    parser.add_argument('--review-ratio', type=float, default=0.6, help='share of completed orders with a review')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    dataset, tables = generate(args)
+    conn = mysql.connector.connect(host=db.DB_HOST, port=db.DB_PORT, user=db.DB_USER,
+                                   password=db.DB_PASSWORD, database=db.DB_NAME)
+    cursor = conn.cursor()
+    try:
+        print(f"Seeding {db.DB_NAME} on {db.DB_HOST}:{db.DB_PORT} (seed={args.seed})")
+        apply_schema(cursor)
+        migrations.migrate(conn)
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table, _, _ in reversed(tables):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        for table, columns, rows in tables:
+            insert(conn, cursor, table, columns, rows)
+        # The summary and rollup tables are derived from the seeded rows, not truncated with them.
+        ratings.rebuild(cursor)
+        analytics.rebuild(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    with open(DATASET_FILE, 'w') as f:
+        json.dump(dataset, f)
+    print(f"Wrote {DATASET_FILE}. Flush Redis (or set CACHE_PREFIX) before benchmarking a fresh dataset.")
+
+
+if __name__ == '__main__':
+    main()
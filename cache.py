@@ -0,0 +1,146 @@
+import json
+import os
+import time
+import uuid
+
+import redis
+
+import db
+
+# Read-through cache for catalog reads, shared by every gunicorn worker through Redis.
+# Entries are stored as JSON under versioned keys: writes bump a namespace version
+# instead of deleting keys, so invalidation is a single INCR and stale entries
+# simply age out through their TTL.
+# With read replicas (db.DB_REPLICAS), a bump also marks the namespace as recently
+# written for db.DB_STICKY_SECONDS. During that window a replica may not have the
+# write yet, so misses are not filled: a stale result stored under the new version
+# would be served to everyone, the writer included, for the whole TTL.
+# If Redis is unreachable every call falls straight through to the loader (the DB)
+# and Redis is left alone for CACHE_RETRY_SECONDS before it is tried again.
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', '1') == '1'
+CACHE_PREFIX = os.environ.get('CACHE_PREFIX', 'freelancerrr')
+CACHE_SOCKET_TIMEOUT = float(os.environ.get('CACHE_SOCKET_TIMEOUT', 0.2))
+CACHE_RETRY_SECONDS = float(os.environ.get('CACHE_RETRY_SECONDS', 30))
+
+# Default TTLs in seconds per kind of entry.
+CATEGORIES_TTL = int(os.environ.get('CACHE_CATEGORIES_TTL', 3600))
+GIG_TTL = int(os.environ.get('CACHE_GIG_TTL', 600))
+GIG_LIST_TTL = int(os.environ.get('CACHE_GIG_LIST_TTL', 60))
+
+_client = None
+_down_until = 0.0
+
+
+def get_redis():
+    """Returns the process-local Redis client, or None while Redis is marked down."""
+    global _client
+    if not CACHE_ENABLED or time.monotonic() < _down_until:
+        return None
+    if _client is None:
+        # Created lazily so each gunicorn worker opens its own sockets after fork.
+        _client = redis.Redis.from_url(REDIS_URL,
+                                       socket_timeout=CACHE_SOCKET_TIMEOUT,
+                                       socket_connect_timeout=CACHE_SOCKET_TIMEOUT)
+    return _client
+
+
+def mark_down(err):
+    global _down_until
+    _down_until = time.monotonic() + CACHE_RETRY_SECONDS
+    print(f"Redis cache unavailable, falling back to database for {CACHE_RETRY_SECONDS}s: {err}")
+
+
+def make_key(*parts):
+    return ':'.join([CACHE_PREFIX] + [str(p) for p in parts])
+
+
+EPOCH_KEY = make_key('epoch')
+
+
+def _read_version(client, namespace):
+    epoch, value, bumped = client.mget(EPOCH_KEY, make_key('version', namespace), make_key('bumped', namespace))
+    if epoch is None:
+        client.set(EPOCH_KEY, uuid.uuid4().hex[:12], nx=True)
+        epoch = client.get(EPOCH_KEY)
+    return f"{epoch.decode()}.{int(value) if value else 0}", bumped is not None
+
+
+def get_version_state(namespace):
+    """Returns (version, recently_bumped); version is None if Redis is unavailable.
+
+    Versions look like '<epoch>.<n>'. Counters start again at 0 when Redis loses
+    its data; the epoch is a random value stored the first time it is needed, so
+    versions (and the ETags built from them) from before such a reset never match
+    the ones counted up after it. recently_bumped is only ever True with read replicas.
+    """
+    client = get_redis()
+    if client is None:
+        return None, False
+    try:
+        return _read_version(client, namespace)
+    except redis.RedisError as err:
+        mark_down(err)
+        return None, False
+
+
+def get_version(namespace):
+    """Returns the current version of a namespace, or None if Redis is unavailable."""
+    return get_version_state(namespace)[0]
+
+
+def bump_version(namespace):
+    """Invalidates every entry cached under a namespace."""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(make_key('version', namespace))
+        if db.DB_REPLICAS:
+            pipe.set(make_key('bumped', namespace), 1, px=max(1, int(db.DB_STICKY_SECONDS * 1000)))
+        pipe.execute()
+    except redis.RedisError as err:
+        mark_down(err)
+
+
+def read_through(key_parts, ttl, loader, namespace=None):
+    """Returns the cached value for key_parts, calling loader() on a miss.
+
+    When namespace is given the key is scoped to that namespace's current version,
+    so bump_version(namespace) invalidates it, and misses right after a bump are
+    not stored (see the replica note above). loader() must return a
+    JSON-serialisable value (raw row types are handled by db.json_default);
+    None results are not cached.
+    """
+    client = get_redis()
+    if client is None:
+        return loader()
+
+    fill = True
+    if namespace is not None:
+        try:
+            version, recently_bumped = _read_version(client, namespace)
+        except redis.RedisError as err:
+            mark_down(err)
+            return loader()
+        fill = not recently_bumped
+        key_parts = (namespace, f'v{version}') + tuple(key_parts)
+    key = make_key(*key_parts)
+
+    try:
+        cached_value = client.get(key)
+        if cached_value is not None:
+            return json.loads(cached_value)
+    except redis.RedisError as err:
+        mark_down(err)
+        return loader()
+
+    value = loader()
+    if value is not None and fill:
+        try:
+            client.set(key, json.dumps(value, default=db.json_default), ex=ttl)
+        except redis.RedisError as err:
+            mark_down(err)
+    return value
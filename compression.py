@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+# Response compression negotiated from Accept-Encoding (gzip, then deflate).
+# Buffered responses are compressed once they reach COMPRESSION_MIN_BYTES; below
+# that the framing overhead outweighs the savings. Streamed responses are always
+# compressed, chunk by chunk with a sync flush, so rows still reach the client as
+# they are produced.
+# Responses that carry an ETag (the catalog reads) are the same bytes for every
+# client until the version behind the ETag changes, so their compressed bodies are
+# kept in a per-worker LRU keyed by endpoint, ETag and encoding, bounded to
+# COMPRESSION_CACHE_BYTES. An entry is only reused when a digest of the
+# uncompressed body matches too, so a stale entry (e.g. the same ETag produced from
+# a changed row before its version was bumped) is rebuilt instead of served.
+
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+COMPRESSION_CACHE_BYTES = int(os.environ.get('COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024))
+
+ENCODINGS = ('gzip', 'deflate')
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+# zlib window bits per Content-Encoding: gzip framing, and the zlib format that
+# HTTP calls "deflate".
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+_cache = OrderedDict()  # (endpoint, etag, encoding) -> (digest of the uncompressed body, compressed body)
+_cache_bytes = 0
+_lock = threading.Lock()
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate(accept_encodings):
+    """Returns the encoding to use for a request's Accept-Encoding, or None."""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def _compressor(encoding):
+    return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, _WBITS[encoding])
+
+
+def compress(data, encoding):
+    compressor = _compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """Compresses an iterable of str/bytes chunks, flushing after each so nothing is held back."""
+    compressor = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def cached_compress(key, data, encoding):
+    """Like compress(), reusing the stored body for key when it was built from the same data.
+
+    Returns (body, hit).
+    """
+    global _cache_bytes
+    digest = _digest(data)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == digest:
+            _cache.move_to_end(key)
+            return entry[1], True
+
+    body = compress(data, encoding)
+    if len(body) > COMPRESSION_CACHE_BYTES // 4:
+        return body, False  # too big to be worth evicting everything else for
+    with _lock:
+        previous = _cache.pop(key, None)
+        if previous is not None:
+            _cache_bytes -= len(previous[1])
+        _cache[key] = (digest, body)
+        _cache_bytes += len(body)
+        while _cache_bytes > COMPRESSION_CACHE_BYTES:
+            _, (_, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+    return body, False
+
+
+def cache_stats():
+    with _lock:
+        return {'entries': len(_cache), 'bytes': _cache_bytes, 'limit_bytes': COMPRESSION_CACHE_BYTES}
@@ -0,0 +1,413 @@
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import mysql.connector
+
+# IMPORTANT: Database Configuration using Environment Variables
+# These variables MUST be set on your Render.com dashboard under the "Environment" tab.
+# Example values (replace with your actual MariaDB credentials):
+# DB_HOST = 'mariadb-198695-0.cloudclusters.net'
+# DB_PORT = '16326' # New: Port for your MariaDB (often non-standard on cloud DBs)
+# DB_USER = 'Abdullah2' # Your MariaDB/MySQL Username - UPDATED
+# DB_PASSWORD = 'abdullah' # Your MariaDB/MySQL Password - UPDATED
+# DB_NAME = 'freelancerrr' # Your MariaDB/MySQL Database Name - UPDATED
+
+# Get database credentials from environment variables, with fallbacks for local development
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_PORT = int(os.environ.get('DB_PORT', 3306))
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
+DB_NAME = os.environ.get('DB_NAME', 'freelancerrr')
+
+# Pool tuning. Each gunicorn worker gets its own pool of DB_POOL_SIZE connections.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+# Seconds a request may wait for a free connection before giving up.
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+# Idle connections older than this many seconds are pinged before being handed out.
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 10))
+# Prepared statements kept per connection (see ConnectionPool.statement); least recently
+# used ones are closed beyond this.
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 64))
+
+# Serving mode, shared with gunicorn.conf.py and the SocketIO setup in app.py:
+# 'gevent' or 'eventlet' (one cooperative worker holds thousands of Socket.IO
+# connections) or 'threading'.
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'gevent')
+# How MySQL calls avoid stalling green workers. mysql-connector's C extension blocks
+# the whole event loop for the duration of every query, so by default green workers
+# use the pure-Python protocol, whose sockets the worker's monkey patching makes
+# cooperative ('pure'). 'tpool' keeps the C extension and runs each call on
+# eventlet's native thread pool instead (eventlet only); 'native' does neither.
+DB_ASYNC_DRIVER = os.environ.get('DB_ASYNC_DRIVER', 'pure' if ASYNC_MODE in ('eventlet', 'gevent') else 'native')
+# Whether repository statements are server-side prepared (binary protocol). The
+# pure-Python driver sends COM_STMT_RESET and waits for its OK before every
+# execute, so a prepared lookup costs two round trips there instead of one; with
+# DB_ASYNC_DRIVER=pure the cached per-statement cursors use the text protocol.
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '0' if DB_ASYNC_DRIVER == 'pure' else '1') == '1'
+
+
+def json_default(value):
+    """json.dumps default= hook for the column types MySQL rows contain."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class PoolTimeout(mysql.connector.errors.PoolError):
+    """Raised when no connection became free within the pool's wait timeout."""
+
+
+# Optional object with observe_query(sql, params, seconds) and observe_rows(sql, count);
+# app.py sets it to the metrics module so every pooled cursor is timed.
+instrumentation = None
+
+
+class TimedCursor:
+    """Wraps a cursor and reports statement timings and fetched row counts to instrumentation."""
+
+    def __init__(self, cursor, observer):
+        self._cursor = cursor
+        self._observer = observer
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _timed(self, method, operation, args, kwargs):
+        self._statement = operation
+        start = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            params = args[0] if args else kwargs.get('params') or kwargs.get('seq_params')
+            self._observer.observe_query(operation, params, time.perf_counter() - start)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, args, kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, args, kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._observer.observe_rows(self._statement, 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._observer.observe_rows(self._statement, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._observer.observe_rows(self._statement, len(rows))
+        return rows
+
+
+class PooledConnection:
+    """Wraps a raw connection checked out of a ConnectionPool; close() returns it."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        # Optional callable run after the connection is back in the pool.
+        self.on_release = None
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        if instrumentation is None:
+            return cursor
+        return TimedCursor(cursor, instrumentation)
+
+    def statement(self, sql):
+        return self._pool.statement(self._conn, sql)
+
+    def forget_statement(self, sql):
+        self._pool.forget_statement(self._conn, sql)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                self._pool.release(conn)
+            finally:
+                if self.on_release is not None:
+                    self.on_release()
+
+
+class StatementEntry:
+    """The cursor reused for one statement, plus its column names and row type once known."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.columns = None
+        self.row_type = None
+
+    def close(self):
+        try:
+            self.cursor.close()
+        except mysql.connector.Error:
+            pass
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of MySQL connections.
+
+    Unlike mysql.connector.pooling, callers wait up to `timeout` seconds for a free
+    connection instead of failing immediately, and idle connections are validated
+    before reuse.
+    """
+
+    def __init__(self, size, timeout, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.name = 'primary'
+        self.role = 'primary'
+        self._connect_args = connect_args
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._statements = {}  # id(raw connection) -> OrderedDict(sql -> StatementEntry)
+        self.stats = {
+            'checkouts': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'exhausted': 0,
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'in_use': 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _open(self):
+        if DB_ASYNC_DRIVER == 'tpool':
+            from eventlet import tpool
+            conn = tpool.Proxy(tpool.execute(mysql.connector.connect, **self._connect_args),
+                               autowrap_names=('cursor',))
+        elif DB_ASYNC_DRIVER == 'pure':
+            conn = mysql.connector.connect(use_pure=True, **self._connect_args)
+        else:
+            conn = mysql.connector.connect(**self._connect_args)
+        self._count('connections_opened')
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._statements.pop(id(conn), None)
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        self._count('connections_closed')
+
+    def get_connection(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('exhausted')
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        waited = time.monotonic() - start
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self.stats['in_use'] += 1
+            self.stats['wait_seconds_total'] += waited
+            self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], waited)
+
+        try:
+            return PooledConnection(self, self._checkout())
+        except Exception:
+            self._count('in_use', -1)
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if time.monotonic() - returned_at < DB_POOL_PING_AFTER:
+                return conn
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except mysql.connector.Error:
+                # Stale (server closed it, network blip); drop it and try the next one.
+                self._discard(conn)
+
+    def release(self, conn):
+        self._count('in_use', -1)
+        try:
+            # A stream abandoned mid-result leaves rows on the socket; draining them
+            # could take as long as the query, so the connection is dropped instead.
+            if self._closed or getattr(conn, 'unread_result', False):
+                self._discard(conn)
+                return
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put((conn, time.monotonic()))
+            except mysql.connector.Error:
+                self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def statement(self, conn, sql):
+        """Returns the StatementEntry for sql on conn; its cursor is reused on every checkout."""
+        with self._lock:
+            statements = self._statements.setdefault(id(conn), OrderedDict())
+        entry = statements.get(sql)
+        if entry is not None:
+            statements.move_to_end(sql)
+            return entry
+        entry = statements[sql] = StatementEntry(conn.cursor(prepared=True) if DB_PREPARED_STATEMENTS else conn.cursor())
+        if len(statements) > DB_STATEMENT_CACHE_SIZE:
+            _, oldest = statements.popitem(last=False)
+            oldest.close()
+        return entry
+
+    def forget_statement(self, conn, sql):
+        """Drops sql's prepared statement on conn, e.g. after it failed."""
+        with self._lock:
+            statements = self._statements.get(id(conn), {})
+        entry = statements.pop(sql, None)
+        if entry is not None:
+            entry.close()
+
+    def close(self):
+        """Closes idle connections; connections still in use are closed when returned."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        stats['live_connections'] = stats['connections_opened'] - stats['connections_closed']
+        return stats
+
+
+# Read replicas: DB_REPLICAS="host[:port][=weight],..." (same user, password and
+# database as the primary). GET handlers read from a replica picked by weight;
+# everything else, and reads from clients that wrote within DB_STICKY_SECONDS,
+# goes to the primary (see get_db_connection in app.py).
+def _parse_replicas(value):
+    replicas = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        address, _, weight = item.partition('=')
+        host, _, port = address.partition(':')
+        replicas.append((host, int(port or DB_PORT), float(weight or 1)))
+    return replicas
+
+
+DB_REPLICAS = _parse_replicas(os.environ.get('DB_REPLICAS', ''))
+DB_REPLICA_POOL_SIZE = int(os.environ.get('DB_REPLICA_POOL_SIZE', DB_POOL_SIZE))
+DB_STICKY_SECONDS = float(os.environ.get('DB_STICKY_SECONDS', 5))
+
+_pools = {}
+_pools_pid = None
+_pool_lock = threading.Lock()
+
+
+def _create_pool(name):
+    if name == 'primary':
+        host, port, size = DB_HOST, DB_PORT, DB_POOL_SIZE
+    else:
+        host, port, _ = DB_REPLICAS[int(name.split('-')[1])]
+        size = DB_REPLICA_POOL_SIZE
+    pool = ConnectionPool(size, DB_POOL_TIMEOUT,
+                          host=host,
+                          port=port,
+                          user=DB_USER,
+                          password=DB_PASSWORD,
+                          database=DB_NAME)
+    pool.name = name
+    pool.role = 'primary' if name == 'primary' else 'replica'
+    print(f"MySQL connection pool '{name}' created (host={host}, size={size}, driver={DB_ASYNC_DRIVER}, pid={pool.pid}).")
+    return pool
+
+
+def get_pool(name='primary'):
+    """Returns this process's pool called name ('primary' or 'replica-N'), creating it on first use after fork."""
+    global _pools, _pools_pid
+    pool = _pools.get(name)
+    if pool is not None and _pools_pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        if name not in _pools:
+            _pools[name] = _create_pool(name)
+        return _pools[name]
+
+
+def get_replica_pool():
+    """Returns a replica pool chosen by weight, or None if no replicas are configured."""
+    if not DB_REPLICAS:
+        return None
+    index = random.choices(range(len(DB_REPLICAS)), weights=[r[2] for r in DB_REPLICAS])[0]
+    return get_pool(f'replica-{index}')
+
+
+def pool_capacity(role):
+    """Total connections available to requests routed to role."""
+    if role == 'replica':
+        return DB_REPLICA_POOL_SIZE * len(DB_REPLICAS)
+    return DB_POOL_SIZE
+
+
+def rebuild_pool(broken_pool):
+    """Replaces broken_pool with a fresh one unless another thread already has."""
+    with _pool_lock:
+        if _pools_pid == os.getpid() and _pools.get(broken_pool.name) is broken_pool:
+            broken_pool.close()
+            _pools[broken_pool.name] = _create_pool(broken_pool.name)
+    return get_pool(broken_pool.name)
+
+
+def _reset_after_fork():
+    # The parent's sockets must not be used (or closed) by the child.
+    global _pools, _pools_pid, _pool_lock
+    _pools, _pools_pid = {}, None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def pool_stats():
+    """Returns {pool name: stats} for this process's pools."""
+    if _pools_pid != os.getpid():
+        return {}
+    return {name: pool.snapshot() for name, pool in list(_pools.items())}
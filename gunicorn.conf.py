@@ -0,0 +1,27 @@
+import os
+
+# Gunicorn settings; the Procfile runs: gunicorn -c gunicorn.conf.py app:app
+# ASYNC_MODE=gevent (default) runs cooperative workers, so each open Socket.IO
+# connection costs a green thread instead of a whole worker; gevent-websocket's
+# worker class adds the WebSocket upgrade on top of gunicorn's gevent worker.
+# ASYNC_MODE=eventlet needs a gunicorn release that still ships the eventlet worker
+# (25.x or older; it was removed in 26.0). ASYNC_MODE=threading falls back to
+# gthread workers.
+# More than one worker per node needs a load balancer with sticky sessions for
+# Socket.IO long-polling; rooms are shared between workers through Redis either way.
+
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'gevent')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = {
+    'gevent': 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker',
+    'eventlet': 'eventlet',
+    'threading': 'gthread',
+}[ASYNC_MODE]
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Concurrent clients per green worker.
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 5000))
+# Threads per gthread worker.
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import redis
+from flask import jsonify, make_response, request
+
+import cache
+
+# Idempotency-Key support for POST endpoints that create rows.
+# A client that sends "Idempotency-Key: <unique value>" can retry the request safely:
+# the first response (anything below 500) is stored in Redis for IDEMPOTENCY_TTL
+# seconds and every retry with the same key gets it back, marked with
+# "Idempotent-Replayed: true", without the handler running again (no MySQL write,
+# no Socket.IO broadcast).
+# Concurrent duplicates are serialised by a per-key lock (SET NX with a TTL): the
+# request that takes it runs the handler, the others wait up to
+# IDEMPOTENCY_WAIT_SECONDS for its response and otherwise get 409 with Retry-After.
+# Reusing a key with a different request body is rejected with 422.
+# 5xx responses are not stored, so those can be retried. If Redis is unavailable
+# the handler simply runs, as it did before keys were supported.
+
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 30))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 5))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Stores the response and releases the lock in one step, but only if this request
+# still holds the lock (it may have expired and been taken by a retry).
+_COMPLETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _fingerprint():
+    return hashlib.sha256(request.get_data()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return jsonify({'message': f'{HEADER} was already used with a different request body'}), 422
+    response = make_response(stored['body'], stored['status'])
+    response.mimetype = stored['mimetype']
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _load(client, response_key):
+    value = client.get(response_key)
+    return json.loads(value) if value is not None else None
+
+
+def idempotent(scope):
+    """Decorates a view so that requests carrying an Idempotency-Key are executed at most once."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'message': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+            client = cache.get_redis()
+            if client is None:
+                return view(*args, **kwargs)
+
+            digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+            response_key = cache.make_key('idempotency', scope, digest)
+            lock_key = cache.make_key('idempotency', scope, digest, 'lock')
+            fingerprint = _fingerprint()
+            token = uuid.uuid4().hex
+            try:
+                deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+                while True:
+                    stored = _load(client, response_key)
+                    if stored is not None:
+                        return _replay(stored, fingerprint)
+                    if client.set(lock_key, token, nx=True, ex=IDEMPOTENCY_LOCK_SECONDS):
+                        # The holder before us may have finished between the two calls.
+                        stored = _load(client, response_key)
+                        if stored is not None:
+                            client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                            return _replay(stored, fingerprint)
+                        break
+                    if time.monotonic() >= deadline:
+                        response = jsonify({'message': f'A request with this {HEADER} is still being processed'})
+                        response.headers['Retry-After'] = '1'
+                        return response, 409
+                    time.sleep(IDEMPOTENCY_POLL_SECONDS)
+            except redis.RedisError as err:
+                cache.mark_down(err)
+                return view(*args, **kwargs)
+
+            completed = False
+            try:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code < 500 and not response.is_streamed:
+                    stored = {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'mimetype': response.mimetype,
+                        'body': response.get_data(as_text=True),
+                    }
+                    try:
+                        client.eval(_COMPLETE_SCRIPT, 2, lock_key, response_key, token,
+                                    json.dumps(stored), IDEMPOTENCY_TTL)
+                        completed = True
+                    except redis.RedisError as err:
+                        cache.mark_down(err)
+                return response
+            finally:
+                if not completed:
+                    try:
+                        client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                    except redis.RedisError as err:
+                        cache.mark_down(err)
+        return wrapper
+    return decorator
@@ -0,0 +1,33 @@
+from flask import g
+
+# Per-request batching loaders.
+# A RowLoader turns lookups by id into one `WHERE id IN (...)` query and remembers
+# the rows for the rest of the request, so an id requested twice (or by two
+# different code paths in the same request) is only fetched once.
+
+
+class RowLoader:
+    def __init__(self, fetch):
+        # fetch(ids) -> {id: row} for the ids that exist.
+        self._fetch = fetch
+        self._rows = {}
+
+    def load_many(self, ids):
+        """Returns the row (or None) for each id, in the order given."""
+        missing = [i for i in dict.fromkeys(ids) if i not in self._rows]
+        if missing:
+            found = self._fetch(missing)
+            for i in missing:
+                self._rows[i] = found.get(i)
+        return [self._rows[i] for i in ids]
+
+    def load(self, id_):
+        return self.load_many([id_])[0]
+
+
+def get_loader(name, fetch):
+    """Returns this request's loader called name, creating it with fetch on first use."""
+    loaders = g.setdefault('loaders', {})
+    if name not in loaders:
+        loaders[name] = RowLoader(fetch)
+    return loaders[name]
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+import redis
+from flask import has_request_context, request
+
+import cache
+
+# Latency and volume instrumentation, exported in the Prometheus text format by GET /metrics.
+# Each worker accumulates increments locally and adds them every METRICS_PUSH_SECONDS
+# to one Redis hash with HINCRBYFLOAT, so /metrics (served by any worker) returns
+# totals for all gunicorn workers, and a worker exiting loses at most its last
+# few seconds of increments instead of making counters go backwards.
+# With SLOW_QUERY_SECONDS set, statements slower than that are printed along with
+# the endpoint that ran them.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_PUSH_SECONDS = float(os.environ.get('METRICS_PUSH_SECONDS', 5))
+# Optional bearer token required by GET /metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0))  # 0 disables the slow-query log
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by Flask endpoint.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Response body size by Flask endpoint.', SIZE_BUCKETS),
+    'db_query_duration_seconds': ('histogram', 'Statement execution time by endpoint and statement.', LATENCY_BUCKETS),
+    'db_rows_returned_total': ('counter', 'Rows fetched by endpoint and statement.', None),
+    'db_pool_wait_seconds': ('histogram', 'Time spent checking a connection out of a pool.', LATENCY_BUCKETS),
+    'socketio_emit_duration_seconds': ('histogram', 'Socket.IO emit latency by event.', LATENCY_BUCKETS),
+    'http_compression_cache_total': ('counter', 'Compressed-body cache lookups by endpoint and result.', None),
+}
+
+STORE_KEY = cache.make_key('metrics')
+
+_pending = defaultdict(float)  # (name, labels, sample suffix) -> increment not yet in Redis
+_lock = threading.Lock()
+_last_push = 0.0
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(name, value, **labels):
+    """Records value in histogram name."""
+    if not METRICS_ENABLED:
+        return
+    key = _labels(labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        for bound in buckets:
+            if value <= bound:
+                _pending[(name, key, ('le', bound))] += 1
+        _pending[(name, key, ('le', '+Inf'))] += 1
+        _pending[(name, key, 'sum')] += value
+        _pending[(name, key, 'count')] += 1
+
+
+def inc(name, amount=1, **labels):
+    """Adds amount to counter name."""
+    if not METRICS_ENABLED or not amount:
+        return
+    with _lock:
+        _pending[(name, _labels(labels), 'total')] += amount
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+# --- Database statements ---
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_VALUES_LIST_RE = re.compile(r'\(%s, \.\.\.\)(?:\s*,\s*\(%s, \.\.\.\))+')
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(sql):
+    """Collapses whitespace and variable-length placeholder lists, so IN (...) and
+    multi-row VALUES statements of any length normalize to the same text."""
+    sql = ' '.join(str(sql).split())
+    sql = _PLACEHOLDER_LIST_RE.sub('(%s, ...)', sql)
+    return _VALUES_LIST_RE.sub('(%s, ...), ...', sql)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Short label such as 'SELECT gigs#1a2b3c' (verb, first table, hash of the normalized text)."""
+    normalized = normalize_statement(sql)
+    verb = normalized.split(' ', 1)[0].upper() if normalized else '?'
+    table = _TABLE_RE.search(normalized)
+    digest = hashlib.sha1(normalized.encode()).hexdigest()[:6]
+    return f"{verb} {table.group(1) if table else '-'}#{digest}"
+
+
+def observe_query(sql, params, seconds):
+    """Called by db.TimedCursor after every execute()."""
+    endpoint = current_endpoint()
+    label = statement_label(sql)
+    observe('db_query_duration_seconds', seconds, endpoint=endpoint, statement=label)
+    if SLOW_QUERY_SECONDS and seconds >= SLOW_QUERY_SECONDS:
+        print(f"Slow query ({seconds * 1000:.0f} ms, endpoint={endpoint}, {label}): {normalize_statement(sql)[:1000]}")
+
+
+def observe_rows(sql, count):
+    """Called by db.TimedCursor after every fetch."""
+    inc('db_rows_returned_total', count, endpoint=current_endpoint(), statement=statement_label(sql))
+
+
+# --- Aggregation across workers ---
+def _field(name, labels, sample):
+    return json.dumps([name, labels, sample])
+
+
+def push(force=False):
+    """Adds this worker's pending increments to the shared Redis hash (at most every METRICS_PUSH_SECONDS)."""
+    global _last_push
+    if not METRICS_ENABLED or (not force and time.monotonic() - _last_push < METRICS_PUSH_SECONDS):
+        return True
+    client = cache.get_redis()
+    if client is None:
+        return False
+    with _lock:
+        _last_push = time.monotonic()
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return True
+    try:
+        pipe = client.pipeline(transaction=True)
+        for (name, labels, sample), amount in batch.items():
+            pipe.hincrbyfloat(STORE_KEY, _field(name, labels, sample), amount)
+        pipe.execute()
+        return True
+    except redis.RedisError as err:
+        cache.mark_down(err)
+        # Keep the increments for the next push.
+        with _lock:
+            for key, amount in batch.items():
+                _pending[key] += amount
+        return False
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _sample_line(name, labels, sample, value):
+    labels = list(labels)
+    if sample == 'total':
+        metric = name
+    elif sample in ('sum', 'count'):
+        metric = f"{name}_{sample}"
+    else:
+        metric = f"{name}_bucket"
+        labels.append(('le', str(sample[1])))
+    label_text = ','.join('{}="{}"'.format(key, str(value_).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value_ in labels)
+    return f"{metric}{{{label_text}}} {_format_value(value)}" if labels else f"{metric} {_format_value(value)}"
+
+
+def _sort_key(item):
+    (name, labels, sample), _ = item
+    if isinstance(sample, (list, tuple)):
+        order = (0, float('inf') if sample[1] == '+Inf' else float(sample[1]))
+    else:
+        order = (1, 0.0 if sample == 'sum' else 1.0)
+    return name, labels, order
+
+
+def render():
+    """Returns every worker's totals in the Prometheus text format, or None if Redis is unavailable."""
+    if not push(force=True):
+        return None
+    client = cache.get_redis()
+    try:
+        stored = client.hgetall(STORE_KEY)
+    except redis.RedisError as err:
+        cache.mark_down(err)
+        return None
+
+    samples = []
+    for field, value in stored.items():
+        name, labels, sample = json.loads(field)
+        if name in METRICS:
+            samples.append(((name, tuple(tuple(pair) for pair in labels), sample), value))
+    samples.sort(key=_sort_key)
+
+    lines = []
+    current = None
+    for (name, labels, sample), value in samples:
+        if name != current:
+            current = name
+            kind, help_text, _ = METRICS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        lines.append(_sample_line(name, labels, sample, value))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,135 @@
+import mysql.connector
+
+# Versioned schema migrations.
+# Each migration is (version, description, [statements]) and runs once; applied
+# versions are recorded in schema_migrations. Append new migrations with the next
+# version number and never edit one that has already shipped.
+# Run with: flask --app app migrate
+#
+# Deploys must migrate before the new code serves traffic: the gig, review and
+# order handlers read and write tables created here and fail with 500 without
+# them. The Procfile's release phase runs the command on every deploy; on a host
+# without a release phase, run it as a pre-deploy step. It is a no-op when the
+# schema is up to date. Summary tables are backfilled by the command when their
+# migration is first applied (see migrate_command in app.py).
+
+MIGRATIONS = [
+    (1, 'gig and freelancer rating summaries', [
+        """
+        CREATE TABLE IF NOT EXISTS gig_rating_summary (
+            gig_id INT NOT NULL PRIMARY KEY,
+            rating_count INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_sum INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_1 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_2 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_3 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_4 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_5 INT UNSIGNED NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS freelancer_rating_summary (
+            freelancer_id INT NOT NULL PRIMARY KEY,
+            rating_count INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_sum INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_1 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_2 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_3 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_4 INT UNSIGNED NOT NULL DEFAULT 0,
+            rating_5 INT UNSIGNED NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    (2, 'FULLTEXT index for gig search', [
+        "ALTER TABLE gigs ADD FULLTEXT INDEX ft_gigs_title_description (title, description)",
+    ]),
+    (3, 'composite indexes for filtered gig listing', [
+        "CREATE INDEX idx_gigs_created ON gigs (created_at, gig_id)",
+        "CREATE INDEX idx_gigs_category_created ON gigs (category_id, created_at, gig_id)",
+        "CREATE INDEX idx_gigs_user_created ON gigs (user_id, created_at, gig_id)",
+    ]),
+    # gigs(created_at) is covered by idx_gigs_created from migration 3.
+    (4, 'indexes for order, message, review and login lookups', [
+        "CREATE INDEX idx_orders_buyer_date ON orders (buyer_id, order_date)",
+        "CREATE INDEX idx_orders_freelancer_date ON orders (freelancer_id, order_date)",
+        "CREATE INDEX idx_orders_gig ON orders (gig_id)",
+        "CREATE INDEX idx_messages_order_sent ON messages (order_id, sent_at)",
+        "CREATE INDEX idx_reviews_order_reviewer ON reviews (order_id, reviewer_id)",
+        "CREATE INDEX idx_users_email ON users (email)",
+    ]),
+    (5, 'freelancer daily order analytics', [
+        """
+        CREATE TABLE IF NOT EXISTS freelancer_daily_stats (
+            freelancer_id INT NOT NULL,
+            day DATE NOT NULL,
+            orders_placed INT NOT NULL DEFAULT 0,
+            pending_count INT NOT NULL DEFAULT 0,
+            in_progress_count INT NOT NULL DEFAULT 0,
+            completed_count INT NOT NULL DEFAULT 0,
+            cancelled_count INT NOT NULL DEFAULT 0,
+            delivered_count INT NOT NULL DEFAULT 0,
+            earnings DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            completion_days_sum INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (freelancer_id, day)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    # GET /api/messages paging (since_id/before_id/limit) filters and orders on
+    # (order_id, message_id); without this it falls back to the plain order_id index
+    # and sorts. Databases that got the index with an earlier build of migration 4
+    # skip it (ER_DUP_KEYNAME is tolerated).
+    (6, 'index for message paging', [
+        "CREATE INDEX idx_messages_order_id ON messages (order_id, message_id)",
+    ]),
+]
+
+
+# Errors that mean a statement has nothing (more) to do rather than that it failed.
+TOLERATED_ERRORS = {
+    1061: 'index already exists',  # ER_DUP_KEYNAME, e.g. re-running a half-applied migration
+    1214: 'no FULLTEXT support',  # ER_TABLE_CANT_HANDLE_FT; search uses its in-process index
+}
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        ) ENGINE=InnoDB
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    """Applies every pending migration in order; returns the versions applied."""
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        applied = []
+        for version, description, statements in MIGRATIONS:
+            if version in done:
+                continue
+            print(f"Applying migration {version}: {description}")
+            # DDL commits implicitly in MySQL; the version row is written last so a
+            # failed migration is retried (its statements must be re-runnable or
+            # fail with one of TOLERATED_ERRORS when repeated).
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except mysql.connector.Error as err:
+                    if err.errno not in TOLERATED_ERRORS:
+                        raise
+                    print(f"  skipped ({TOLERATED_ERRORS[err.errno]}): {err}")
+            cursor.execute("INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, NOW())",
+                           (version, description))
+            conn.commit()
+            applied.append(version)
+        return applied
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
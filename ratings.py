@@ -0,0 +1,57 @@
+# Incrementally maintained rating summaries (see migration 1).
+# submit_review calls record_review() inside its transaction, so a gig's or a
+# freelancer's average, count and 1-5 histogram are always one primary-key row
+# away instead of a scan over reviews JOIN orders.
+
+SUMMARY_COLUMNS = ('rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+_UPSERT = """
+    INSERT INTO {table} ({key}, rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    VALUES (%s, 1, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        rating_count = rating_count + 1,
+        rating_sum = rating_sum + VALUES(rating_sum),
+        rating_1 = rating_1 + VALUES(rating_1),
+        rating_2 = rating_2 + VALUES(rating_2),
+        rating_3 = rating_3 + VALUES(rating_3),
+        rating_4 = rating_4 + VALUES(rating_4),
+        rating_5 = rating_5 + VALUES(rating_5)
+"""
+
+_REBUILD = """
+    INSERT INTO {table} ({key}, rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    SELECT o.{source}, COUNT(*), SUM(r.rating),
+           SUM(r.rating = 1), SUM(r.rating = 2), SUM(r.rating = 3), SUM(r.rating = 4), SUM(r.rating = 5)
+    FROM reviews AS r
+    JOIN orders AS o ON r.order_id = o.order_id
+    GROUP BY o.{source}
+"""
+
+SUMMARIES = (
+    ('gig_rating_summary', 'gig_id', 'gig_id'),
+    ('freelancer_rating_summary', 'freelancer_id', 'freelancer_id'),
+)
+
+
+def record_review(cursor, gig_id, freelancer_id, rating):
+    """Adds one rating to the gig's and the freelancer's summaries (caller commits)."""
+    histogram = [1 if rating == star else 0 for star in range(1, 6)]
+    for (table, key, _), key_value in zip(SUMMARIES, (gig_id, freelancer_id)):
+        cursor.execute(_UPSERT.format(table=table, key=key), (key_value, rating, *histogram))
+
+
+def rebuild(cursor):
+    """Recomputes every summary from the reviews table (caller commits)."""
+    for table, key, source in SUMMARIES:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(_REBUILD.format(table=table, key=key, source=source))
+
+
+def summary_from_row(row):
+    """Turns a summary row (dict with SUMMARY_COLUMNS, possibly all None) into the API shape."""
+    count = row.get('rating_count') or 0
+    return {
+        'average': round(row['rating_sum'] / count, 2) if count else None,
+        'count': count,
+        'histogram': {str(star): row.get(f'rating_{star}') or 0 for star in range(1, 6)},
+    }
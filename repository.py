@@ -0,0 +1,331 @@
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import mysql.connector
+
+import analytics
+import db
+import ratings
+
+# Shared data access.
+# session() checks a connection out, commits (for writes) or rolls back, and
+# always returns it to the pool. Each pooled connection keeps one cursor per SQL
+# string (see ConnectionPool.statement); with db.DB_PREPARED_STATEMENTS (the
+# default except on the pure-Python driver) it is a server-side prepared statement,
+# prepared once and re-executed from then on.
+# all()/one() return namedtuples whose type is built once per statement, for rows
+# the code reads; records()/record() build dicts straight from the fetched tuples
+# for rows that go to jsonify.
+#
+# Only constant SQL strings belong here: every distinct string is prepared and
+# cached separately. Queries whose text varies (IN lists, optional filters) keep
+# using plain cursors; helpers that take a cursor (analytics, ratings, similar_gigs)
+# get one from Session.cursor(), on the same connection and transaction.
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when no database connection could be obtained."""
+
+
+class Session:
+    def __init__(self, conn):
+        self.conn = conn
+        self._cursors = []
+
+    def cursor(self, **kwargs):
+        """Returns a plain (buffered) cursor in this session's transaction; closed with the session."""
+        cursor = self.conn.cursor(buffered=True, **kwargs)
+        self._cursors.append(cursor)
+        return cursor
+
+    def close_cursors(self):
+        for cursor in self._cursors:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+        self._cursors = []
+
+    def _run(self, sql, params):
+        """Executes sql on its cached cursor; returns (entry, fetched tuples or None)."""
+        entry = self.conn.statement(sql)
+        start = time.perf_counter()
+        try:
+            entry.cursor.execute(sql, params)
+            rows = entry.cursor.fetchall() if entry.cursor.description else None
+        except mysql.connector.Error:
+            self.conn.forget_statement(sql)
+            raise
+        finally:
+            if db.instrumentation is not None:
+                db.instrumentation.observe_query(sql, params, time.perf_counter() - start)
+        if rows is None:
+            return entry, None
+        if db.instrumentation is not None:
+            db.instrumentation.observe_rows(sql, len(rows))
+        if entry.columns is None:
+            entry.columns = tuple(column[0] for column in entry.cursor.description)
+        return entry, rows
+
+    def all(self, sql, params=()):
+        entry, rows = self._run(sql, params)
+        if entry.row_type is None:
+            entry.row_type = namedtuple('Row', entry.columns, rename=True)
+        return [entry.row_type._make(row) for row in rows]
+
+    def one(self, sql, params=()):
+        """Returns the first row, or None."""
+        rows = self.all(sql, params)
+        return rows[0] if rows else None
+
+    def records(self, sql, params=()):
+        """Like all(), as dicts keyed by column."""
+        entry, rows = self._run(sql, params)
+        columns = entry.columns
+        return [dict(zip(columns, row)) for row in rows]
+
+    def record(self, sql, params=()):
+        rows = self.records(sql, params)
+        return rows[0] if rows else None
+
+    def scalar(self, sql, params=()):
+        row = self.one(sql, params)
+        return row[0] if row else None
+
+    def execute(self, sql, params=()):
+        """Runs a write; returns (rowcount, lastrowid)."""
+        entry, _ = self._run(sql, params)
+        return entry.cursor.rowcount, entry.cursor.lastrowid
+
+
+@contextmanager
+def session(get_connection, write=False):
+    """Yields a Session on a pooled connection; with write=True it commits when the block succeeds."""
+    conn = get_connection()
+    if conn is None:
+        raise DatabaseUnavailable()
+    s = Session(conn)
+    try:
+        yield s
+        s.close_cursors()
+        if write:
+            conn.commit()
+    except BaseException:
+        s.close_cursors()
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+# --- Users ---
+USER_COLUMNS = "user_id, name, email, user_type, created_at AS join_date"
+_USER_BY_ID = f"SELECT {USER_COLUMNS} FROM users WHERE user_id = %s"
+_USER_BY_LOGIN = f"SELECT {USER_COLUMNS} FROM users WHERE email = %s AND password = %s"
+_USER_ID_BY_EMAIL = "SELECT user_id FROM users WHERE email = %s"
+_INSERT_USER = "INSERT INTO users (name, email, password, user_type, created_at) VALUES (%s, %s, %s, %s, %s)"
+
+
+def get_user(s, user_id):
+    return s.record(_USER_BY_ID, (user_id,))
+
+
+def find_user_by_login(s, email, password):
+    return s.record(_USER_BY_LOGIN, (email, password))
+
+
+def email_taken(s, email):
+    return s.one(_USER_ID_BY_EMAIL, (email,)) is not None
+
+
+def create_user(s, name, email, password, user_type, join_date):
+    """Inserts a user (committed by the write session); returns the new user_id."""
+    return s.execute(_INSERT_USER, (name, email, password, user_type, join_date))[1]
+
+
+# --- Gigs and categories ---
+_GIG_BY_ID = f"""
+    SELECT g.gig_id AS id,
+           g.user_id,
+           g.title,
+           g.description,
+           c.name AS category,
+           g.price,
+           g.created_at,
+           {', '.join('s.' + column for column in ratings.SUMMARY_COLUMNS)}
+    FROM gigs AS g
+    JOIN categories AS c ON g.category_id = c.category_id
+    LEFT JOIN gig_rating_summary AS s ON s.gig_id = g.gig_id
+    WHERE g.gig_id = %s
+"""
+_CATEGORIES = "SELECT category_id AS id, name FROM categories"
+_CATEGORY_ID_BY_NAME = "SELECT category_id FROM categories WHERE name = %s"
+_INSERT_GIG = "INSERT INTO gigs (user_id, title, description, category_id, price) VALUES (%s, %s, %s, %s, %s)"
+_FREELANCER_RATING = (f"SELECT {', '.join(ratings.SUMMARY_COLUMNS)} "
+                      "FROM freelancer_rating_summary WHERE freelancer_id = %s")
+
+
+def get_gig(s, gig_id):
+    """Returns the gig as a dict with its rating summary under 'rating', or None."""
+    gig = s.record(_GIG_BY_ID, (gig_id,))
+    if gig is None:
+        return None
+    gig['rating'] = ratings.summary_from_row(gig)
+    for column in ratings.SUMMARY_COLUMNS:
+        del gig[column]
+    return gig
+
+
+def list_categories(s):
+    return s.records(_CATEGORIES)
+
+
+def get_category_id(s, name):
+    return s.scalar(_CATEGORY_ID_BY_NAME, (name,))
+
+
+def create_gig(s, user_id, title, description, category_id, price):
+    """Inserts a gig (committed by the write session); returns the new gig_id."""
+    return s.execute(_INSERT_GIG, (user_id, title, description, category_id, price))[1]
+
+
+def get_freelancer_rating(s, freelancer_id):
+    return ratings.summary_from_row(s.record(_FREELANCER_RATING, (freelancer_id,)) or {})
+
+
+# --- Orders ---
+_ORDER_EXISTS = "SELECT 1 FROM orders WHERE order_id = %s"
+# The gig/buyer/freelancer checks are the joins of the INSERT ... SELECT itself,
+# so validation and insert are one atomic statement and one round trip.
+_INSERT_ORDER = """
+    INSERT INTO orders (gig_id, buyer_id, freelancer_id, status, order_date)
+    SELECT g.gig_id, b.user_id, f.user_id, %s, %s
+    FROM gigs AS g
+    JOIN users AS b ON b.user_id = %s
+    JOIN users AS f ON f.user_id = %s
+    WHERE g.gig_id = %s
+"""
+_ORDER_REFERENCES = """
+    SELECT EXISTS(SELECT 1 FROM gigs WHERE gig_id = %s),
+           EXISTS(SELECT 1 FROM users WHERE user_id = %s),
+           EXISTS(SELECT 1 FROM users WHERE user_id = %s)
+"""
+_ORDER_COLUMNS = "order_id AS id, gig_id, buyer_id, freelancer_id, status, order_date, delivery_date"
+# user_type -> orders of that user, newest first. The streaming variant of
+# GET /api/orders runs the same SQL on an unbuffered plain cursor.
+ORDERS_BY_USER = {
+    'buyer': f"SELECT {_ORDER_COLUMNS} FROM orders WHERE buyer_id = %s ORDER BY order_date DESC",
+    'freelancer': f"SELECT {_ORDER_COLUMNS} FROM orders WHERE freelancer_id = %s ORDER BY order_date DESC",
+}
+_UPDATE_ORDER_STATUS = "UPDATE orders SET status = %s WHERE order_id = %s"
+_COMPLETE_ORDER = "UPDATE orders SET status = %s, delivery_date = %s WHERE order_id = %s"
+_ORDER_GIG_AND_FREELANCER = "SELECT gig_id, freelancer_id FROM orders WHERE order_id = %s"
+
+
+def order_exists(s, order_id):
+    return s.one(_ORDER_EXISTS, (order_id,)) is not None
+
+
+def create_order(s, gig_id, buyer_id, freelancer_id, status, order_date):
+    """Inserts an order if the gig and both users exist; returns the new order_id, or None."""
+    rowcount, order_id = s.execute(_INSERT_ORDER, (status, order_date, buyer_id, freelancer_id, gig_id))
+    return order_id if rowcount else None
+
+
+def missing_order_reference(s, gig_id, buyer_id, freelancer_id):
+    """Returns the 404 message for whichever referenced row does not exist, or None."""
+    gig_exists, buyer_exists, freelancer_exists = s.one(_ORDER_REFERENCES, (gig_id, buyer_id, freelancer_id))
+    if not gig_exists:
+        return 'Gig not found'
+    if not buyer_exists:
+        return 'Buyer not found'
+    if not freelancer_exists:
+        return 'Freelancer not found'
+    return None
+
+
+def orders_for_user(s, user_id, user_type):
+    return s.records(ORDERS_BY_USER[user_type], (user_id,))
+
+
+def update_order_status(s, order_id, status, delivery_date=None):
+    """Sets the status (and delivery_date, when given); returns the number of rows changed."""
+    if delivery_date is not None:
+        return s.execute(_COMPLETE_ORDER, (status, delivery_date, order_id))[0]
+    return s.execute(_UPDATE_ORDER_STATUS, (status, order_id))[0]
+
+
+def get_order_gig_and_freelancer(s, order_id):
+    return s.one(_ORDER_GIG_AND_FREELANCER, (order_id,))
+
+
+# --- Messages ---
+_INSERT_MESSAGE = ("INSERT INTO messages (order_id, sender_id, receiver_id, message_text, sent_at) "
+                   "VALUES (%s, %s, %s, %s, NOW())")
+
+
+def create_message(s, order_id, sender_id, receiver_id, message_text):
+    """Inserts a message (committed by the write session); returns the new message_id."""
+    return s.execute(_INSERT_MESSAGE, (order_id, sender_id, receiver_id, message_text))[1]
+
+
+# --- Reviews ---
+# Reviews are never edited or deleted, so (count, max id) changes exactly when the
+# result set does and makes a cheap validator.
+_REVIEWS_VALIDATOR_BY_ORDER = "SELECT COUNT(*) AS total, MAX(review_id) AS last_id FROM reviews WHERE order_id = %s"
+_REVIEWS_VALIDATOR_BY_GIG = """
+    SELECT COUNT(*) AS total, MAX(r.review_id) AS last_id
+    FROM reviews AS r
+    JOIN orders AS o ON r.order_id = o.order_id
+    WHERE o.gig_id = %s
+"""
+_REVIEWS_BY_ORDER = ("SELECT review_id AS id, order_id, reviewer_id, rating, comment, review_date "
+                     "FROM reviews WHERE order_id = %s ORDER BY review_date DESC")
+_REVIEWS_BY_GIG = """
+    SELECT r.review_id AS id, r.order_id, r.reviewer_id, r.rating, r.comment, r.review_date
+    FROM reviews AS r
+    JOIN orders AS o ON r.order_id = o.order_id
+    WHERE o.gig_id = %s
+    ORDER BY r.review_date DESC
+"""
+_REVIEW_BY_REVIEWER = "SELECT review_id FROM reviews WHERE order_id = %s AND reviewer_id = %s"
+_INSERT_REVIEW = "INSERT INTO reviews (order_id, reviewer_id, rating, comment, review_date) VALUES (%s, %s, %s, %s, %s)"
+
+
+def reviews_validator(s, order_id=None, gig_id=None):
+    """Returns (total, last_id) for the reviews of an order or, without order_id, of a gig."""
+    if order_id:
+        return s.one(_REVIEWS_VALIDATOR_BY_ORDER, (order_id,))
+    return s.one(_REVIEWS_VALIDATOR_BY_GIG, (gig_id,))
+
+
+def list_reviews(s, order_id=None, gig_id=None):
+    if order_id:
+        return s.records(_REVIEWS_BY_ORDER, (order_id,))
+    return s.records(_REVIEWS_BY_GIG, (gig_id,))
+
+
+def has_reviewed(s, order_id, reviewer_id):
+    return s.one(_REVIEW_BY_REVIEWER, (order_id, reviewer_id)) is not None
+
+
+def create_review(s, order_id, reviewer_id, rating, comment, review_date):
+    """Inserts a review (committed by the write session); returns the new review_id."""
+    return s.execute(_INSERT_REVIEW, (order_id, reviewer_id, rating, comment, review_date))[1]
+
+
+# --- Analytics ---
+_FREELANCER_DAILY_STATS = f"""
+    SELECT day, {', '.join(analytics.COUNTER_COLUMNS)}
+    FROM freelancer_daily_stats
+    WHERE freelancer_id = %s AND day BETWEEN %s AND %s
+    ORDER BY day
+"""
+
+
+def freelancer_daily_stats(s, freelancer_id, start, end):
+    return s.records(_FREELANCER_DAILY_STATS, (freelancer_id, start, end))
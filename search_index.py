@@ -0,0 +1,103 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+# In-process inverted index over gig titles and descriptions, used by
+# GET /api/gigs/search when the database has no FULLTEXT index on gigs.
+# Gigs are never edited, so the index is kept current by adding new gigs:
+# create_gig adds its gig directly and every search first pulls any gigs with a
+# higher id than the index has seen (cheap primary-key range scan), which keeps
+# the indexes of all gunicorn workers in step. The pull re-reads the last
+# REFRESH_OVERLAP ids because an id can commit after a higher one was already
+# seen; re-adding a known gig is a no-op.
+# Ranking is BM25 with titles weighted above descriptions.
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset('a an and are as at be by for from i in is it of on or the to with you your'.split())
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+REFRESH_OVERLAP = 100
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class GigSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # token -> {gig_id: weighted term frequency}
+        self._docs = {}  # gig_id -> (category, price, length)
+        self._total_length = 0
+        self.last_gig_id = 0  # Highest id pulled by refresh(); add() alone does not move it.
+
+    def add(self, gig_id, title, description, category, price):
+        counts = defaultdict(int)
+        for token in tokenize(title):
+            counts[token] += TITLE_WEIGHT
+        for token in tokenize(description):
+            counts[token] += 1
+        length = sum(counts.values())
+        with self._lock:
+            if gig_id in self._docs:
+                return
+            for token, count in counts.items():
+                self._postings[token][gig_id] = count
+            self._docs[gig_id] = (category, float(price), length)
+            self._total_length += length
+
+    def search(self, query, category=None, min_price=None, max_price=None):
+        """Returns [(gig_id, score)] for every matching gig, best first."""
+        tokens = set(tokenize(query))
+        with self._lock:
+            doc_count = len(self._docs)
+            if not tokens or not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+            scores = defaultdict(float)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for gig_id, tf in postings.items():
+                    length = self._docs[gig_id][2]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[gig_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            results = []
+            for gig_id, score in scores.items():
+                doc_category, price, _ = self._docs[gig_id]
+                if category is not None and doc_category != category:
+                    continue
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                results.append((gig_id, score))
+        results.sort(key=lambda item: (-item[1], -item[0]))
+        return results
+
+
+_index = GigSearchIndex()
+_refresh_lock = threading.Lock()
+
+
+def get_index():
+    return _index
+
+
+def refresh(cursor):
+    """Adds every gig newer than the index's high-water mark (cursor must be a plain tuple cursor)."""
+    with _refresh_lock:
+        cursor.execute("""
+            SELECT g.gig_id, g.title, g.description, c.name, g.price
+            FROM gigs AS g
+            JOIN categories AS c ON g.category_id = c.category_id
+            WHERE g.gig_id > %s
+            ORDER BY g.gig_id
+        """, (max(0, _index.last_gig_id - REFRESH_OVERLAP),))
+        for row in cursor.fetchall():
+            _index.add(*row)
+            _index.last_gig_id = max(_index.last_gig_id, row[0])
@@ -0,0 +1,429 @@
+import fcntl
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # GET /api/gigs/<id>/similar answers 503 without NumPy
+    np = None
+
+import mysql.connector
+
+import db
+import search_index
+
+# "Similar gigs" index: one TF-IDF vector per gig over its title, description and
+# category, compared by cosine similarity.
+# Vectors use the hashing trick: every token is hashed to one of
+# SIMILAR_GIGS_DIMENSIONS columns with a random sign, which keeps the matrix dense
+# and its width fixed however large the vocabulary grows. Rows are L2-normalised, so
+# the similarities to one gig are a single matrix-vector product and the top k come
+# from argpartition. The cost is reading the matrix once: at the default width
+# 100k gigs are 100 MB, about 15 ms on one core (halve the width to halve it).
+#
+# The matrix lives in memory-mapped files under SIMILAR_GIGS_DIR shared by every
+# gunicorn worker on the host:
+#   meta     header (int64[8]) followed by hashed document frequencies (int32[DF_BUCKETS])
+#   ids      gig id of each row (int64[capacity])
+#   vectors  the rows (float32[capacity, dimensions])
+# Requests never build the files: until they exist, lookups answer 503 and the
+# first one on a host starts a background build (ensure_index), which one worker
+# per host runs (the build.lock flock) with a database connection held only while
+# the gigs are read. The vectors are computed on a native thread (gevent's or
+# eventlet's thread pool), so a green worker keeps serving its other requests and
+# Socket.IO connections meanwhile. `flask --app app rebuild-similar-gigs` builds
+# them up front.
+# After that create_gig appends its gig, and a lookup for a gig newer than the
+# last one indexed pulls any newer gigs first. Appends take an exclusive flock on
+# the lock file, write the row and only then raise the header's row count, so
+# readers never need the lock; gigs that are already indexed are skipped before
+# the lock is taken. Appended rows are weighted with the document frequencies at
+# the time; the rebuild command recomputes every row. A rebuild writes new files
+# and renames them into place (meta last); workers notice the new inode of meta and
+# map the new files.
+# flock is polled with LOCK_NB, so under gevent/eventlet a worker waiting for the
+# lock keeps serving other requests.
+
+SIMILAR_GIGS_DIR = os.environ.get('SIMILAR_GIGS_DIR', os.path.join(tempfile.gettempdir(), 'freelancerrr-similar-gigs'))
+SIMILAR_GIGS_DIMENSIONS = int(os.environ.get('SIMILAR_GIGS_DIMENSIONS', 256))
+
+FORMAT_VERSION = 1
+DF_BUCKETS = 1 << 20
+INITIAL_CAPACITY = 1024
+CATEGORY_WEIGHT = 2
+REFRESH_OVERLAP = search_index.REFRESH_OVERLAP
+FILE_LOCK_POLL_SECONDS = 0.01
+
+# Header slots.
+H_FORMAT, H_DIMENSIONS, H_CAPACITY, H_COUNT, H_LAST_GIG_ID = range(5)
+HEADER_SIZE = 8
+
+SELECT_GIGS = """
+    SELECT g.gig_id, g.title, g.description, c.name
+    FROM gigs AS g
+    JOIN categories AS c ON g.category_id = c.category_id
+    WHERE g.gig_id > %s
+    ORDER BY g.gig_id
+"""
+
+
+def available():
+    return np is not None
+
+
+@lru_cache(maxsize=65536)
+def _hash(token):
+    # Python's hash() differs per process, so a fixed hash keeps all workers in agreement.
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def features(title, description, category):
+    """Returns {token: weighted term frequency} for one gig."""
+    counts = defaultdict(float)
+    for token in search_index.tokenize(title):
+        counts[token] += search_index.TITLE_WEIGHT
+    for token in search_index.tokenize(description):
+        counts[token] += 1
+    if category:
+        counts['category:' + category.lower()] += CATEGORY_WEIGHT
+    return counts
+
+
+def _flatten(docs):
+    """Returns (row, token hash, term frequency) arrays for a list of features() dicts."""
+    rows, hashes, frequencies = [], [], []
+    for row, counts in enumerate(docs):
+        for token, frequency in counts.items():
+            rows.append(row)
+            hashes.append(_hash(token))
+            frequencies.append(frequency)
+    return (np.array(rows, dtype=np.intp), np.array(hashes, dtype=np.uint64),
+            np.array(frequencies, dtype=np.float64))
+
+
+def _add_document_frequencies(df, hashes):
+    np.add.at(df, (hashes % np.uint64(DF_BUCKETS)).astype(np.intp), 1)
+
+
+def _compute(gigs, dimensions):
+    """Returns (document frequencies, vectors) for a full build; pure CPU work."""
+    flat = _flatten([features(*gig[1:]) for gig in gigs])
+    df = np.zeros(DF_BUCKETS, dtype=np.int32)
+    _add_document_frequencies(df, flat[1])
+    return df, _vectors(len(gigs), flat, df, len(gigs), dimensions)
+
+
+def run_in_native_thread(function, *args):
+    """Runs CPU-bound work on an OS thread, so a green worker's event loop keeps running."""
+    if db.ASYNC_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args)
+    if db.ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(function, *args)
+    return function(*args)
+
+
+def _vectors(row_count, flat, df, doc_count, dimensions):
+    """Builds L2-normalised TF-IDF rows (float32[row_count, dimensions])."""
+    rows, hashes, frequencies = flat
+    idf = np.log((1 + doc_count) / (1 + df[(hashes % np.uint64(DF_BUCKETS)).astype(np.intp)])) + 1
+    sign = np.where((hashes >> np.uint64(63)) == 1, -1.0, 1.0)
+    columns = ((hashes >> np.uint64(1)) % np.uint64(dimensions)).astype(np.intp)
+    matrix = np.zeros((row_count, dimensions), dtype=np.float32)
+    np.add.at(matrix, (rows, columns), (sign * (1 + np.log(frequencies)) * idf).astype(np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    return matrix
+
+
+class SimilarGigsIndex:
+    def __init__(self, directory, dimensions):
+        self.directory = directory
+        self.dimensions = dimensions
+        self._meta_path = os.path.join(directory, 'meta')
+        self._ids_path = os.path.join(directory, 'ids')
+        self._vectors_path = os.path.join(directory, 'vectors')
+        self._lock_path = os.path.join(directory, 'lock')
+        self._build_lock_path = os.path.join(directory, 'build.lock')
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._meta_inode = None
+        self._header = self._df = self._ids = self._vectors = None
+        self._positions = {}  # gig_id -> row, for the rows seen so far
+        self._seen = 0
+
+    @contextmanager
+    def _file_lock(self, operation, path=None, wait=True):
+        """Holds a flock on the lock file; yields False instead of waiting when wait=False and it is taken."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Opened per use: a descriptor inherited across fork would share one lock between workers.
+        with open(path or self._lock_path, 'a') as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, operation | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not wait:
+                        yield False
+                        return
+                    time.sleep(FILE_LOCK_POLL_SECONDS)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def build_lock(self):
+        """Yields whether this process may build the index; at most one build runs per host."""
+        return self._file_lock(fcntl.LOCK_EX, self._build_lock_path, wait=False)
+
+    def _map(self):
+        """(Re)maps the files if a rebuild replaced them or they grew; returns the header or None."""
+        try:
+            inode = os.stat(self._meta_path).st_ino
+        except FileNotFoundError:
+            self._reset()
+            return None
+        if inode != self._meta_inode:
+            self._reset()
+            header = np.memmap(self._meta_path, dtype=np.int64, mode='r+', shape=(HEADER_SIZE,))
+            if header[H_FORMAT] != FORMAT_VERSION or header[H_DIMENSIONS] != self.dimensions:
+                return None
+            self._header = header
+            self._df = np.memmap(self._meta_path, dtype=np.int32, mode='r+',
+                                 offset=HEADER_SIZE * 8, shape=(DF_BUCKETS,))
+            self._meta_inode = inode
+        capacity = int(self._header[H_CAPACITY])
+        if self._ids is None or len(self._ids) != capacity:
+            self._ids = np.memmap(self._ids_path, dtype=np.int64, mode='r+', shape=(capacity,))
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+',
+                                      shape=(capacity, self.dimensions))
+        count = int(self._header[H_COUNT])
+        for row in range(self._seen, count):
+            self._positions[int(self._ids[row])] = row
+        self._seen = count
+        return self._header
+
+    def _current(self):
+        """Like _map(), taking the shared file lock only when the files changed underneath us."""
+        try:
+            changed = os.stat(self._meta_path).st_ino != self._meta_inode
+        except FileNotFoundError:
+            changed = True
+        if changed or int(self._header[H_CAPACITY]) != len(self._ids):
+            with self._file_lock(fcntl.LOCK_SH):
+                return self._map()
+        return self._map()
+
+    def exists(self):
+        with self._lock:
+            return self._current() is not None
+
+    @property
+    def last_gig_id(self):
+        with self._lock:
+            header = self._current()
+            return int(header[H_LAST_GIG_ID]) if header is not None else 0
+
+    def build(self, gigs, replace=True, run=None):
+        """Writes a new index from (gig_id, title, description, category) rows.
+
+        With replace=False nothing is done if another worker built the index first.
+        The vectors are computed before the file lock is taken, through
+        run(function, *args) when given (e.g. run_in_native_thread).
+        """
+        if not replace and self.exists():
+            return
+        if run is None:
+            df, vectors = _compute(gigs, self.dimensions)
+        else:
+            df, vectors = run(_compute, gigs, self.dimensions)
+        capacity = max(INITIAL_CAPACITY, 1 << math.ceil(math.log2(len(gigs) + 1)))
+
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            if not replace and self._map() is not None:
+                return
+            suffix = f'.{os.getpid()}.tmp'
+            ids_file = np.memmap(self._ids_path + suffix, dtype=np.int64, mode='w+', shape=(capacity,))
+            ids_file[:len(gigs)] = [gig[0] for gig in gigs]
+            ids_file.flush()
+            vectors_file = np.memmap(self._vectors_path + suffix, dtype=np.float32, mode='w+',
+                                     shape=(capacity, self.dimensions))
+            vectors_file[:len(gigs)] = vectors
+            vectors_file.flush()
+            header = np.zeros(HEADER_SIZE, dtype=np.int64)
+            header[[H_FORMAT, H_DIMENSIONS, H_CAPACITY, H_COUNT]] = FORMAT_VERSION, self.dimensions, capacity, len(gigs)
+            header[H_LAST_GIG_ID] = max((gig[0] for gig in gigs), default=0)
+            with open(self._meta_path + suffix, 'wb') as f:
+                f.write(header.tobytes())
+                f.write(df.tobytes())
+            del ids_file, vectors_file
+
+            os.replace(self._ids_path + suffix, self._ids_path)
+            os.replace(self._vectors_path + suffix, self._vectors_path)
+            os.replace(self._meta_path + suffix, self._meta_path)
+            self._map()
+
+    def _unindexed(self, gigs):
+        new, seen = [], set()
+        for gig in gigs:
+            if gig[0] not in self._positions and gig[0] not in seen:
+                seen.add(gig[0])
+                new.append(gig)
+        return new
+
+    def add(self, gigs):
+        """Appends (gig_id, title, description, category) rows not indexed yet; False if there is no index."""
+        with self._lock:
+            # Without the file lock first: a refresh usually finds nothing new.
+            if self._current() is None:
+                return False
+            if not self._unindexed(gigs):
+                return True
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            header = self._map()
+            if header is None:
+                return False
+            new = self._unindexed(gigs)  # another worker may have appended some meanwhile
+            if not new:
+                return True
+
+            flat = _flatten([features(*gig[1:]) for gig in new])
+            _add_document_frequencies(self._df, flat[1])
+            count = int(header[H_COUNT])
+            vectors = _vectors(len(new), flat, self._df, count + len(new), self.dimensions)
+
+            capacity = int(header[H_CAPACITY])
+            if count + len(new) > capacity:
+                while count + len(new) > capacity:
+                    capacity *= 2
+                for path, row_size in ((self._ids_path, 8), (self._vectors_path, 4 * self.dimensions)):
+                    with open(path, 'r+b') as f:
+                        f.truncate(capacity * row_size)
+                header[H_CAPACITY] = capacity
+                self._map()
+
+            self._ids[count:count + len(new)] = [gig[0] for gig in new]
+            self._vectors[count:count + len(new)] = vectors
+            header[H_LAST_GIG_ID] = max(int(header[H_LAST_GIG_ID]), max(gig[0] for gig in new))
+            header[H_COUNT] = count + len(new)  # last, so readers only see complete rows
+            self._map()
+            return True
+
+    def similar(self, gig_id, limit):
+        """Returns [(gig_id, score)] for the limit most similar gigs, or None if gig_id is not indexed."""
+        with self._lock:
+            header = self._current()
+            if header is None or gig_id not in self._positions:
+                return None
+            row = self._positions[gig_id]
+            count = int(header[H_COUNT])
+            vectors = self._vectors[:count]
+            ids = self._ids
+        scores = vectors @ vectors[row]
+        scores[row] = -np.inf
+        k = min(limit, count - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+_index = None
+_index_lock = threading.Lock()
+_build_started_pid = None
+_build_start_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarGigsIndex(SIMILAR_GIGS_DIR, SIMILAR_GIGS_DIMENSIONS)
+        return _index
+
+
+def rebuild(cursor, replace=True):
+    """Builds the index from every gig (cursor must be a plain tuple cursor)."""
+    cursor.execute(SELECT_GIGS, (0,))
+    get_index().build(cursor.fetchall(), replace=replace)
+
+
+def _build_in_background(get_connection):
+    global _build_started_pid
+    index = get_index()
+    try:
+        with index.build_lock() as acquired:
+            if not acquired or index.exists():
+                return
+            conn = get_connection()
+            if conn is None:
+                print("Could not build the similar gigs index: database connection failed")
+                return
+            cursor = conn.cursor()
+            try:
+                cursor.execute(SELECT_GIGS, (0,))
+                gigs = cursor.fetchall()
+            finally:
+                cursor.close()
+                conn.close()
+            index.build(gigs, replace=False, run=run_in_native_thread)
+            print(f"Similar gigs index built in {SIMILAR_GIGS_DIR} ({len(gigs)} gigs).")
+    except (OSError, mysql.connector.Error) as err:
+        print(f"Could not build the similar gigs index: {err}")
+    finally:
+        with _build_start_lock:
+            _build_started_pid = None  # the next lookup retries if the index is still missing
+
+
+def ensure_index(get_connection, start_background_task):
+    """True if the index exists; otherwise starts building it in the background (once per process)."""
+    global _build_started_pid
+    if get_index().exists():
+        return True
+    with _build_start_lock:
+        if _build_started_pid != os.getpid():
+            _build_started_pid = os.getpid()
+            start_background_task(_build_in_background, get_connection)
+    return False
+
+
+def refresh(cursor):
+    """Appends every gig newer than the index's high-water mark."""
+    index = get_index()
+    cursor.execute(SELECT_GIGS, (max(0, index.last_gig_id - REFRESH_OVERLAP),))
+    index.add(cursor.fetchall())
+
+
+def similar(cursor, gig_id, limit):
+    """Returns [(gig_id, score)], best first, or None if the gig is not indexed.
+
+    Only gigs newer than the last one indexed can be missing (create_gig appends
+    its gig), so only those trigger a refresh; anything else is an unknown id.
+    """
+    index = get_index()
+    ranked = index.similar(gig_id, limit)
+    if ranked is None and gig_id > index.last_gig_id and index.exists():
+        refresh(cursor)
+        ranked = index.similar(gig_id, limit)
+    return ranked
+
+
+def add_gig(gig_id, title, description, category):
+    """Adds a newly created gig; a failure only delays it until the next refresh."""
+    if not available():
+        return
+    try:
+        get_index().add([(gig_id, title, description, category)])
+    except OSError as err:
+        print(f"Could not add gig {gig_id} to the similar gigs index: {err}")
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import admission
+
+
+def make_controller(capacity=5, write_reserve=1, endpoint_limits=None):
+    return admission.AdmissionController(capacity, write_reserve, endpoint_limits or {})
+
+
+def wait_for_waiting_writes(controller, count):
+    deadline = time.monotonic() + 1
+    while controller.snapshot()['waiting_writes'] != count:
+        assert time.monotonic() < deadline, 'the write never started waiting'
+        time.sleep(0.005)
+
+
+def test_read_not_blocked_by_write_waiting_on_its_endpoint_limit(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_WRITE_TIMEOUT', 1)
+    monkeypatch.setattr(admission, 'ADMISSION_READ_TIMEOUT', 0.2)
+    controller = make_controller(endpoint_limits={'create_order': 1})
+    assert controller.acquire('create_order', 'write')
+
+    waiter = threading.Thread(target=controller.acquire, args=('create_order', 'write'))
+    waiter.start()
+    wait_for_waiting_writes(controller, 1)
+
+    started = time.monotonic()
+    assert controller.acquire('get_all_gigs', 'read')
+    assert time.monotonic() - started < 0.1
+
+    controller.release('create_order')
+    waiter.join()
+    assert controller.snapshot()['admitted_write'] == 2
+
+
+def test_read_gives_way_to_write_waiting_for_a_connection(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_WRITE_TIMEOUT', 1)
+    monkeypatch.setattr(admission, 'ADMISSION_READ_TIMEOUT', 0.1)
+    controller = make_controller(capacity=2, write_reserve=0)
+    assert controller.acquire('send_message', 'write')
+    assert controller.acquire('send_message', 'write')
+
+    waiter = threading.Thread(target=controller.acquire, args=('create_order', 'write'))
+    waiter.start()
+    wait_for_waiting_writes(controller, 1)
+
+    assert not controller.acquire('get_all_gigs', 'read')
+
+    controller.release('send_message')
+    waiter.join()
+    assert controller.snapshot()['admitted_write'] == 3
+
+
+def test_endpoint_limit_applies_to_reads(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_READ_TIMEOUT', 0.05)
+    controller = make_controller(endpoint_limits={'get_all_gigs': 1})
+    assert controller.acquire('get_all_gigs', 'read')
+    assert not controller.acquire('get_all_gigs', 'read')
+    assert controller.acquire('get_categories', 'read')
@@ -0,0 +1,78 @@
+from datetime import date
+from decimal import Decimal
+
+import analytics
+
+
+class RecordingCursor:
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((' '.join(sql.split()), params))
+
+    def fetchone(self):
+        return self.results.pop(0) if self.results else None
+
+
+def test_lock_order_locks_only_the_order_row():
+    cursor = RecordingCursor([(5, date(2024, 1, 1), 'pending', None, 9), (Decimal('40.00'),)])
+    order = analytics.lock_order(cursor, 3)
+    assert order == (5, date(2024, 1, 1), 'pending', None, Decimal('40.00'))
+    locking = [sql for sql, _ in cursor.statements if 'FOR UPDATE' in sql]
+    assert len(locking) == 1 and 'JOIN' not in locking[0] and 'gigs' not in locking[0]
+
+
+def test_lock_order_missing_order():
+    cursor = RecordingCursor()
+    assert analytics.lock_order(cursor, 3) is None
+    assert len(cursor.statements) == 1
+
+
+def recorded_deltas(cursor):
+    """{(freelancer_id, day): {column: delta}} from the _add statements a cursor received."""
+    deltas = {}
+    for sql, params in cursor.statements:
+        columns = sql.split('(', 1)[1].split(')', 1)[0].split(', ')[2:]
+        row = deltas.setdefault((params[0], params[1]), {})
+        for column, value in zip(columns, params[2:]):
+            row[column] = row.get(column, 0) + value
+    return deltas
+
+
+def test_completing_an_order_moves_the_funnel_and_adds_the_delivery():
+    cursor = RecordingCursor()
+    order = (5, date(2024, 1, 1), 'pending', None, Decimal('40.00'))
+    analytics.record_status_change(cursor, order, 'completed', date(2024, 1, 4))
+    assert recorded_deltas(cursor) == {
+        (5, date(2024, 1, 1)): {'pending_count': -1, 'completed_count': 1},
+        (5, date(2024, 1, 4)): {'delivered_count': 1, 'earnings': Decimal('40.00'), 'completion_days_sum': 3},
+    }
+
+
+def test_cancelling_a_completed_order_takes_the_delivery_back():
+    cursor = RecordingCursor()
+    order = (5, date(2024, 1, 1), 'completed', date(2024, 1, 4), Decimal('40.00'))
+    analytics.record_status_change(cursor, order, 'cancelled', None)
+    assert recorded_deltas(cursor) == {
+        (5, date(2024, 1, 1)): {'completed_count': -1, 'cancelled_count': 1},
+        (5, date(2024, 1, 4)): {'delivered_count': -1, 'earnings': Decimal('-40.00'), 'completion_days_sum': -3},
+    }
+
+
+def test_recompleting_moves_the_delivery_to_the_new_day():
+    cursor = RecordingCursor()
+    order = (5, date(2024, 1, 1), 'completed', date(2024, 1, 4), None)
+    analytics.record_status_change(cursor, order, 'completed', date(2024, 1, 6))
+    assert recorded_deltas(cursor) == {
+        (5, date(2024, 1, 4)): {'delivered_count': -1, 'earnings': 0, 'completion_days_sum': -3},
+        (5, date(2024, 1, 6)): {'delivered_count': 1, 'earnings': 0, 'completion_days_sum': 5},
+    }
+
+
+def test_unchanged_status_writes_nothing():
+    cursor = RecordingCursor()
+    analytics.record_status_change(cursor, (5, date(2024, 1, 1), 'in_progress', None, Decimal('40.00')),
+                                   'in_progress', None)
+    assert cursor.statements == []
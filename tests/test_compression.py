@@ -0,0 +1,19 @@
+import zlib
+
+import compression
+
+
+def test_cached_body_not_reused_for_different_data_of_same_size():
+    key = ('get_all_gigs', 'etag-1', 'gzip')
+    first = b'{"price": 10}' * 200
+    second = b'{"price": 20}' * 200
+
+    body, hit = compression.cached_compress(key, first, 'gzip')
+    assert not hit
+    body, hit = compression.cached_compress(key, second, 'gzip')
+    assert not hit
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == second
+
+    body, hit = compression.cached_compress(key, second, 'gzip')
+    assert hit
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == second
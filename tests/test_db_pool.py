@@ -0,0 +1,36 @@
+import db
+
+
+class FakeConnection:
+    def __init__(self, unread_result=False):
+        self.unread_result = unread_result
+        self.in_transaction = False
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def checked_out(pool, conn):
+    pool._slots.acquire()
+    pool._count('in_use')
+    return conn
+
+
+def test_release_keeps_clean_connection():
+    pool = db.ConnectionPool(1, 0.1)
+    conn = checked_out(pool, FakeConnection())
+    pool.release(conn)
+    assert not conn.closed
+    assert pool._idle.qsize() == 1
+
+
+def test_release_discards_connection_with_unread_rows():
+    pool = db.ConnectionPool(1, 0.1)
+    conn = checked_out(pool, FakeConnection(unread_result=True))
+    pool.release(conn)
+    assert conn.closed
+    assert pool._idle.qsize() == 0
+    # The slot is free again.
+    assert pool._slots.acquire(timeout=0)
+    assert pool.stats['in_use'] == 0
@@ -0,0 +1,71 @@
+import hashlib
+
+import pytest
+from flask import Flask, jsonify
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')  # fakeredis runs the Lua scripts through lupa
+
+import cache
+import idempotency
+
+
+@pytest.fixture
+def client(monkeypatch):
+    redis_client = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, 'get_redis', lambda: redis_client)
+    monkeypatch.setattr(idempotency, 'IDEMPOTENCY_WAIT_SECONDS', 0.1)
+
+    app = Flask(__name__)
+    app.calls = 0
+    app.status = 201
+
+    @app.route('/orders', methods=['POST'])
+    @idempotency.idempotent('orders')
+    def create_order():
+        app.calls += 1
+        return jsonify({'order_id': app.calls}), app.status
+
+    test_client = app.test_client()
+    test_client.redis = redis_client
+    return test_client
+
+
+def post(client, key, body):
+    return client.post('/orders', json=body, headers={idempotency.HEADER: key})
+
+
+def test_retry_replays_the_stored_response(client):
+    first = post(client, 'k1', {'gig_id': 1})
+    retry = post(client, 'k1', {'gig_id': 1})
+    assert client.application.calls == 1
+    assert (retry.status_code, retry.get_json()) == (201, {'order_id': 1})
+    assert retry.headers[idempotency.REPLAYED_HEADER] == 'true'
+    assert idempotency.REPLAYED_HEADER not in first.headers
+
+    assert post(client, 'k2', {'gig_id': 1}).get_json() == {'order_id': 2}
+
+
+def test_key_reused_with_a_different_body_is_rejected(client):
+    post(client, 'k1', {'gig_id': 1})
+    response = post(client, 'k1', {'gig_id': 2})
+    assert response.status_code == 422
+    assert client.application.calls == 1
+
+
+def test_duplicate_of_a_request_in_progress_gets_409(client):
+    lock_key = cache.make_key('idempotency', 'orders', hashlib.sha256(b'k1').hexdigest(), 'lock')
+    client.redis.set(lock_key, 'another-request')
+    response = post(client, 'k1', {'gig_id': 1})
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert client.application.calls == 0
+
+
+def test_server_errors_are_not_stored(client):
+    client.application.status = 503
+    assert post(client, 'k1', {'gig_id': 1}).status_code == 503
+    client.application.status = 201
+    retry = post(client, 'k1', {'gig_id': 1})
+    assert (retry.status_code, client.application.calls) == (201, 2)
+    assert idempotency.REPLAYED_HEADER not in retry.headers
@@ -0,0 +1,62 @@
+import db
+import repository
+
+
+class FakeCursor:
+    def __init__(self, prepared=False):
+        self.prepared = prepared
+        self.description = None
+
+    def execute(self, sql, params):
+        self.description = [('id',), ('name',)]
+
+    def fetchall(self):
+        return [(1, 'Design'), (2, 'Writing')]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursors = []
+
+    def cursor(self, prepared=False):
+        cursor = FakeCursor(prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+
+class FakePooledConnection:
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.raw = conn
+
+    def statement(self, sql):
+        return self.pool.statement(self.raw, sql)
+
+
+def make_session(monkeypatch, prepared):
+    monkeypatch.setattr(db, 'DB_PREPARED_STATEMENTS', prepared)
+    monkeypatch.setattr(db, 'instrumentation', None)
+    pool = db.ConnectionPool(1, 0.1)
+    conn = FakeConnection()
+    return repository.Session(FakePooledConnection(pool, conn)), conn
+
+
+def test_text_protocol_when_prepared_statements_are_off(monkeypatch):
+    session, conn = make_session(monkeypatch, prepared=False)
+    session.all("SELECT category_id AS id, name FROM categories")
+    session.all("SELECT category_id AS id, name FROM categories")
+    assert [cursor.prepared for cursor in conn.cursors] == [False]
+
+
+def test_prepared_cursor_reused_per_statement(monkeypatch):
+    session, conn = make_session(monkeypatch, prepared=True)
+    session.all("SELECT category_id AS id, name FROM categories")
+    session.all("SELECT category_id AS id, name FROM categories")
+    assert [cursor.prepared for cursor in conn.cursors] == [True]
+
+
+def test_records_and_rows_share_the_statement(monkeypatch):
+    session, _ = make_session(monkeypatch, prepared=False)
+    sql = "SELECT category_id AS id, name FROM categories"
+    assert session.records(sql) == [{'id': 1, 'name': 'Design'}, {'id': 2, 'name': 'Writing'}]
+    assert session.one(sql).name == 'Design'
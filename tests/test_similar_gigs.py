@@ -0,0 +1,61 @@
+import pytest
+
+import similar_gigs
+
+pytestmark = pytest.mark.skipif(not similar_gigs.available(), reason='NumPy is not installed')
+
+GIGS = [(gig_id, f'logo design {gig_id % 3}', f'vector logo brand {gig_id % 5}', 'Design') for gig_id in range(1, 21)]
+
+
+class RecordingCursor:
+    def __init__(self, gigs):
+        self.gigs = gigs
+        self.queries = []
+
+    def execute(self, sql, params):
+        self.queries.append(params)
+        self.after = params[0]
+
+    def fetchall(self):
+        return [gig for gig in self.gigs if gig[0] > self.after]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = similar_gigs.SimilarGigsIndex(str(tmp_path), 64)
+    monkeypatch.setattr(similar_gigs, '_index', index)
+    index.build(GIGS)
+    return index
+
+
+def test_unknown_gig_at_or_below_last_indexed_id_skips_refresh(index):
+    cursor = RecordingCursor(GIGS)
+    index.similar = lambda gig_id, limit: None  # as if gig 5 had never been indexed
+    assert similar_gigs.similar(cursor, 5, 3) is None
+    assert cursor.queries == []
+
+
+def test_newer_gig_is_pulled_in_by_a_refresh(index):
+    cursor = RecordingCursor(GIGS + [(21, 'logo design', 'vector logo brand', 'Design')])
+    ranked = similar_gigs.similar(cursor, 21, 3)
+    assert len(ranked) == 3
+    assert index.last_gig_id == 21
+
+
+def test_build_lock_is_not_waited_for(index):
+    with index.build_lock() as first:
+        with index.build_lock() as second:
+            assert first and not second
+
+
+def test_build_computes_through_run(tmp_path):
+    index = similar_gigs.SimilarGigsIndex(str(tmp_path), 64)
+    calls = []
+
+    def run(function, *args):
+        calls.append(function)
+        return function(*args)
+
+    index.build(GIGS, run=run)
+    assert calls == [similar_gigs._compute]
+    assert index.last_gig_id == 20
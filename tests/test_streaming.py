@@ -0,0 +1,60 @@
+import app
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.closed = False
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.cursors = []
+        self.closed = False
+
+    def cursor(self, **kwargs):
+        cursor = FakeCursor(self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+
+def test_head_of_stream_returns_connection(monkeypatch):
+    conn = FakeConnection([{'id': 1}])
+    monkeypatch.setattr(app, 'get_db_connection', lambda: conn)
+    response = app.app.test_client().head('/api/gigs?stream=1')
+    response.close()
+    assert response.status_code == 200
+    assert conn.closed
+    assert conn.cursors[0].closed
+
+
+def test_stream_closed_before_first_chunk_returns_connection():
+    conn = FakeConnection([{'id': 1}])
+    with app.app.test_request_context('/api/gigs?stream=1'):
+        response = app.stream_rows(conn, conn.cursor())
+    response.close()
+    assert conn.closed
+    assert conn.cursors[0].closed
+
+
+def test_stream_read_to_the_end_closes_once():
+    conn = FakeConnection([{'id': 1}, {'id': 2}])
+    with app.app.test_request_context('/api/gigs?stream=1'):
+        response = app.stream_rows(conn, conn.cursor())
+        assert ''.join(response.response) == '[{"id":1},{"id":2}]'
+    response.close()
+    assert conn.closed
@@ -0,0 +1,107 @@
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')  # fakeredis runs the Lua scripts through lupa
+
+import cache
+import write_behind
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sql, params=()):
+        if sql.startswith('SELECT COALESCE(MAX(message_id)'):
+            self.result = (max(self.db.rows, default=0),)
+        else:
+            self.db.pending.extend(params[i:i + 6] for i in range(0, len(params), 6))
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    """Stands in for the messages table: rows by message_id, visible once committed."""
+
+    def __init__(self, rows=()):
+        self.rows = {row[0]: row for row in rows}
+        self.pending = []
+        self.commits = []
+        self.available = True
+
+    def connect(self):
+        return self if self.available else None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits.append([row[0] for row in self.pending])
+        self.rows.update((row[0], row) for row in self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache, 'get_redis', lambda: client)
+    monkeypatch.setattr(write_behind, 'MESSAGES_FLUSH_BLOCK_MS', 10)
+    client.xgroup_create(write_behind.STREAM_KEY, write_behind.GROUP, id='0', mkstream=True)
+    return client
+
+
+def test_enqueue_seeds_ids_past_the_table_and_flush_acknowledges(client):
+    db = FakeDatabase([(41, 1, 2, 3, 'earlier', '2024-01-01 00:00:00')])
+    first, _ = write_behind.enqueue(db.connect, 1, 2, 3, 'hello')
+    second, _ = write_behind.enqueue(db.connect, 1, 3, 2, 'hi')
+    assert (first, second) == (42, 43)
+
+    assert write_behind.flush_once(client, db.connect, 'worker-1') == 2
+    assert db.commits == [[42, 43]]
+    assert db.rows[43][1:5] == (1, 3, 2, 'hi')
+    assert client.xlen(write_behind.STREAM_KEY) == 0
+    assert client.xpending(write_behind.STREAM_KEY, write_behind.GROUP)['pending'] == 0
+    assert write_behind.flush_once(client, db.connect, 'worker-1') == 0
+
+
+def test_batch_left_pending_while_the_database_is_down_is_written_first(client):
+    db = FakeDatabase()
+    write_behind.enqueue(db.connect, 1, 2, 3, 'one')
+    db.available = False
+    assert write_behind.flush_once(client, db.connect, 'worker-1') == 0
+    assert client.xpending(write_behind.STREAM_KEY, write_behind.GROUP)['pending'] == 1
+
+    write_behind.enqueue(db.connect, 1, 2, 3, 'two')
+    db.available = True
+    assert write_behind.flush_once(client, db.connect, 'worker-1') == 1
+    assert write_behind.flush_once(client, db.connect, 'worker-1') == 1
+    assert db.commits == [[1], [2]]
+
+
+def test_lease_handover_reclaims_the_dead_holders_batch(client):
+    db = FakeDatabase()
+    write_behind.enqueue(db.connect, 1, 2, 3, 'one')
+    assert write_behind.hold_lease(client, 'worker-1')
+    assert not write_behind.hold_lease(client, 'worker-2')
+    assert write_behind.hold_lease(client, 'worker-1')  # renewal
+
+    db.available = False
+    write_behind.flush_once(client, db.connect, 'worker-1')  # read, then worker-1 dies
+    client.delete(write_behind.LEASE_KEY)  # its lease expires
+    db.available = True
+
+    assert write_behind.hold_lease(client, 'worker-2')
+    assert not write_behind.hold_lease(client, 'worker-1')
+    assert write_behind.flush_once(client, db.connect, 'worker-2') == 1
+    assert db.commits == [[1]]
+    assert client.xpending(write_behind.STREAM_KEY, write_behind.GROUP)['pending'] == 0
@@ -0,0 +1,246 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+import redis
+
+import cache
+
+# Write-behind buffer for chat messages.
+# With MESSAGES_WRITE_BEHIND=1, send_message does not INSERT + COMMIT per message.
+# Instead a Lua script atomically takes the next message id from a Redis counter and
+# appends the message to a Redis stream (one round trip), the message is emitted
+# right away, and a background flusher drains the stream into the messages table
+# with multi-row INSERTs.
+#
+# Ordering: ids are allocated and appended in the same script, so stream order and
+# id order agree. Every web worker starts a flusher, but only the one holding the
+# Redis lease (LEASE_KEY, renewed on every batch) drains the stream; the others
+# stand by. With a single writer, batches commit in id order, so a message never
+# becomes visible in MySQL before an earlier one (clients paging with since_id
+# would otherwise skip it for good).
+# Crash recovery: the flusher reads through a consumer group and only XACKs after
+# COMMIT. Before reading new entries, the leaseholder takes over and writes every
+# entry still pending (its own failed batches, or those of a holder that died), so
+# retries keep the order too. Re-flushing is harmless because rows are inserted
+# with their explicit ids. A dead holder delays messages by at most
+# MESSAGES_FLUSHER_LEASE_MS. Durability of queued messages is that of the Redis
+# server (enable appendonly for fsync-on-write semantics).
+
+MESSAGES_WRITE_BEHIND = os.environ.get('MESSAGES_WRITE_BEHIND', '0') == '1'
+MESSAGES_FLUSH_BATCH = int(os.environ.get('MESSAGES_FLUSH_BATCH', 200))
+MESSAGES_FLUSH_BLOCK_MS = int(os.environ.get('MESSAGES_FLUSH_BLOCK_MS', 500))
+MESSAGES_FLUSHER_LEASE_MS = int(os.environ.get('MESSAGES_FLUSHER_LEASE_MS', 15000))
+
+STREAM_KEY = cache.make_key('messages', 'stream')
+COUNTER_KEY = cache.make_key('messages', 'next_id')
+LEASE_KEY = cache.make_key('messages', 'flusher')
+GROUP = 'message-writer'
+
+# Returns nil when the counter does not exist yet so the caller can seed it from MySQL.
+_ENQUEUE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local id = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], '*', 'id', id, 'order_id', ARGV[1], 'sender_id', ARGV[2],
+           'receiver_id', ARGV[3], 'message', ARGV[4], 'sent_at', ARGV[5])
+return id
+"""
+
+# Creates the counter or raises it to at least ARGV[1]; never moves it backwards.
+_RAISE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current or tonumber(current) < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# Takes the flusher lease for ARGV[1] or extends it if ARGV[1] already holds it; returns 1 if held.
+_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+INSERT_COLUMNS = "(message_id, order_id, sender_id, receiver_id, message_text, sent_at)"
+
+
+def _raise_counter(client, cursor):
+    """Moves the id counter past every message_id already in MySQL."""
+    cursor.execute("SELECT COALESCE(MAX(message_id), 0) FROM messages")
+    client.eval(_RAISE_SCRIPT, 1, COUNTER_KEY, cursor.fetchone()[0])
+
+
+def _seed_counter(client, get_connection):
+    conn = get_connection()
+    if conn is None:
+        return False
+    cursor = conn.cursor()
+    try:
+        _raise_counter(client, cursor)
+        return True
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def enqueue(get_connection, order_id, sender_id, receiver_id, message_text):
+    """Queues a message for writing; returns (message_id, sent_at), or None if it could not be queued."""
+    client = cache.get_redis()
+    if client is None:
+        return None
+    sent_at = datetime.now().replace(microsecond=0)
+    args = (order_id, sender_id, receiver_id, message_text, sent_at.isoformat(sep=' '))
+    try:
+        message_id = client.eval(_ENQUEUE_SCRIPT, 2, COUNTER_KEY, STREAM_KEY, *args)
+        if message_id is None:
+            if not _seed_counter(client, get_connection):
+                return None
+            message_id = client.eval(_ENQUEUE_SCRIPT, 2, COUNTER_KEY, STREAM_KEY, *args)
+    except redis.RedisError as err:
+        cache.mark_down(err)
+        return None
+    return int(message_id), sent_at
+
+
+def _decode(fields):
+    row = {k.decode(): v.decode() for k, v in fields.items()}
+    return (int(row['id']), int(row['order_id']), int(row['sender_id']), int(row['receiver_id']),
+            row['message'], row['sent_at'])
+
+
+def _write_rows(conn, cursor, rows):
+    sql = f"INSERT INTO messages {INSERT_COLUMNS} VALUES " + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    cursor.execute(sql, tuple(value for row in rows for value in row))
+    conn.commit()
+
+
+def _write_rows_one_by_one(conn, cursor, rows, client):
+    """Slow path after a batch failed on a constraint: settle each row on its own."""
+    for row in rows:
+        try:
+            _write_rows(conn, cursor, [row])
+            continue
+        except mysql.connector.IntegrityError as err:
+            conn.rollback()
+            if err.errno != 1062:
+                # e.g. the order does not exist; retrying would fail forever.
+                print(f"Dropping queued message {row[0]}: {err}")
+                continue
+
+        cursor.execute("SELECT order_id, sender_id, message_text FROM messages WHERE message_id = %s", (row[0],))
+        existing = cursor.fetchone()
+        if existing and (existing[0], existing[1], existing[2]) == (row[1], row[2], row[4]):
+            continue  # Already flushed before a crash; the entry was just never acknowledged.
+
+        # The id was taken by a message inserted directly while Redis was unavailable.
+        cursor.execute(
+            "INSERT INTO messages (order_id, sender_id, receiver_id, message_text, sent_at) VALUES (%s, %s, %s, %s, %s)",
+            row[1:])
+        conn.commit()
+        print(f"Queued message {row[0]} collided with an existing id; stored as {cursor.lastrowid}")
+        _raise_counter(client, cursor)
+
+
+def hold_lease(client, consumer):
+    return client.eval(_LEASE_SCRIPT, 1, LEASE_KEY, consumer, MESSAGES_FLUSHER_LEASE_MS) == 1
+
+
+def flush_once(client, get_connection, consumer):
+    """Writes one batch of queued messages to MySQL; returns how many entries were settled.
+
+    Only the lease holder may call this. Pending entries (read earlier but never
+    acknowledged, by any consumer) are always written before new ones.
+    """
+    entries = client.xautoclaim(STREAM_KEY, GROUP, consumer, 0, start_id='0-0',
+                                count=MESSAGES_FLUSH_BATCH)[1]
+    entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+    if not entries:
+        response = client.xreadgroup(GROUP, consumer, {STREAM_KEY: '>'},
+                                     count=MESSAGES_FLUSH_BATCH, block=MESSAGES_FLUSH_BLOCK_MS)
+        entries = response[0][1] if response else []
+    entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+    if not entries:
+        return 0
+
+    rows = sorted(_decode(fields) for _, fields in entries)
+    conn = get_connection()
+    if conn is None:
+        return 0  # Left pending; claimed and retried once the database is back.
+    cursor = conn.cursor()
+    try:
+        try:
+            _write_rows(conn, cursor, rows)
+        except mysql.connector.IntegrityError:
+            conn.rollback()
+            _write_rows_one_by_one(conn, cursor, rows, client)
+    finally:
+        cursor.close()
+        conn.close()
+
+    entry_ids = [entry_id for entry_id, _ in entries]
+    pipe = client.pipeline()
+    pipe.xack(STREAM_KEY, GROUP, *entry_ids)
+    pipe.xdel(STREAM_KEY, *entry_ids)
+    pipe.execute()
+    return len(entries)
+
+
+def run(get_connection):
+    """Flusher loop; runs until the process exits."""
+    consumer = f"{socket.gethostname()}-{os.getpid()}"
+    # A dedicated client: the shared cache client's short socket timeout is shorter than the XREADGROUP block.
+    client = redis.Redis.from_url(cache.REDIS_URL, socket_timeout=MESSAGES_FLUSH_BLOCK_MS / 1000 + 5)
+    group_ready = False
+    while True:
+        try:
+            if not group_ready:
+                try:
+                    client.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+                except redis.ResponseError as err:
+                    if 'BUSYGROUP' not in str(err):
+                        raise
+                group_ready = True
+            if not hold_lease(client, consumer):
+                time.sleep(MESSAGES_FLUSHER_LEASE_MS / 3000)  # standby until the holder goes away
+                continue
+            flush_once(client, get_connection, consumer)
+        except redis.RedisError as err:
+            print(f"Message flusher cannot reach Redis: {err}")
+            group_ready = False
+            time.sleep(cache.CACHE_RETRY_SECONDS)
+        except Exception as err:
+            # Database errors, admission rejections, ...: entries stay pending and are retried.
+            print(f"Message flusher error: {err}")
+            time.sleep(1)
+
+
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def start_flusher(get_connection, start_background_task):
+    """Starts one flusher per process (idempotent, fork-aware)."""
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid != os.getpid():
+            _started_pid = os.getpid()
+            start_background_task(run, get_connection)
+
+
+if __name__ == '__main__':
+    # Dedicated flusher process: python write_behind.py
+    from app import get_db_connection
+    run(get_db_connection)